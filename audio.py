@@ -0,0 +1,159 @@
+"""
+Music and sound effects.
+
+The mixer is opened with a small buffer, so a sound starts playing at most
+BUFFER / FREQUENCY seconds (about 12 ms) after play() is called, under one
+60 Hz frame. The music is streamed from disk by pygame.mixer.music and
+loops. The effects are decoded (or, with no file for them in SOUND_DIR,
+synthesized) into memory once, and each plays on a channel of its own that
+the mixer never hands to anything else, so an effect is never dropped or
+delayed for lack of a free channel.
+
+AUDIO is told about jumps, pickups, crashes and milestones by
+simulation.Game (as its observer) and plays the matching effect. Until
+init() is called, and after init(enabled=False), it does nothing at all,
+which is what headless runs want.
+"""
+import os
+import time
+from collections import deque
+
+import numpy
+import pygame
+
+from profiler import PROFILER
+
+FREQUENCY = 44100
+SIZE = -16  # signed 16 bit samples
+CHANNELS = 2
+BUFFER = 512  # samples per mixer callback
+MIXER_CHANNELS = 8
+
+MUSIC_FILE = "Musik.mp3"
+MUSIC_VOLUME = 0.6
+SOUND_DIR = os.path.join("assets", "Sounds")
+SOUND_VOLUME = 0.4
+
+# Effects without a file in SOUND_DIR are synthesized from these square
+# wave (start Hz, end Hz, seconds) segments, after the original game's bleeps
+TONES = {
+    "jump": [(520, 880, 0.07)],
+    "death": [(220, 200, 0.09), (0, 0, 0.03), (180, 120, 0.18)],
+    "powerup": [(660, 660, 0.05), (880, 880, 0.05), (1320, 1320, 0.08)],
+    "milestone": [(1046, 1046, 0.08), (1318, 1318, 0.14)],
+}
+EFFECTS = tuple(TONES)
+LATENCY_SAMPLES = 600
+
+
+def buffer_latency():
+    """Seconds of audio the mixer buffers ahead, the delay between play() and hearing it."""
+    return BUFFER / FREQUENCY
+
+
+def tone(segments, frequency=FREQUENCY, volume=SOUND_VOLUME):
+    """16-bit stereo samples of square wave segments, with the frequency sliding over each one."""
+    parts = []
+    for start, end, seconds in segments:
+        count = int(seconds * frequency)
+        if start == 0:
+            parts.append(numpy.zeros(count))
+            continue
+        # Integrate the sliding frequency into a phase, then take its sign
+        hz = numpy.linspace(start, end, count)
+        phase = numpy.cumsum(hz) / frequency
+        wave = numpy.where(phase % 1.0 < 0.5, 1.0, -1.0)
+        # Short fades at both ends so segments don't click
+        fade = min(count // 2, frequency // 500)
+        if fade:
+            ramp = numpy.linspace(0.0, 1.0, fade)
+            wave[:fade] *= ramp
+            wave[-fade:] *= ramp[::-1]
+        parts.append(wave)
+    mono = (numpy.concatenate(parts) * volume * 32767).astype(numpy.int16)
+    return numpy.column_stack([mono] * CHANNELS)
+
+
+class Audio:
+    """The mixer, the music and one reserved channel per effect."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sounds = {}
+        self.channels = {}
+        self.input_time = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.plays = 0
+
+    def pre_init(self):
+        """Ask for the small buffer; must come before pygame.init() opens the mixer."""
+        pygame.mixer.pre_init(FREQUENCY, SIZE, CHANNELS, BUFFER)
+
+    def init(self, enabled=True, music=MUSIC_FILE):
+        """Open the mixer, load the effects and start the music. enabled=False leaves audio off."""
+        self.enabled = False
+        if not enabled:
+            return False
+        try:
+            pygame.mixer.init(FREQUENCY, SIZE, CHANNELS, BUFFER)
+        except pygame.error:
+            return False  # no audio device: play on in silence
+        pygame.mixer.set_num_channels(max(MIXER_CHANNELS, len(EFFECTS)))
+        pygame.mixer.set_reserved(len(EFFECTS))
+        for index, name in enumerate(EFFECTS):
+            self.sounds[name] = self.load(name)
+            self.channels[name] = pygame.mixer.Channel(index)
+        if music:
+            pygame.mixer.music.load(music)
+            pygame.mixer.music.set_volume(MUSIC_VOLUME)
+            pygame.mixer.music.play(loops=-1)
+        self.enabled = True
+        return True
+
+    def load(self, name):
+        for extension in (".ogg", ".wav"):
+            path = os.path.join(SOUND_DIR, name + extension)
+            if os.path.exists(path):
+                return pygame.mixer.Sound(path)
+        return pygame.sndarray.make_sound(tone(TONES[name]))
+
+    def play(self, name, since=None):
+        """Start effect name now, cutting off the last one. since is when its cause happened, for latency."""
+        if not self.enabled:
+            return
+        self.channels[name].play(self.sounds[name])
+        self.plays += 1
+        if since is not None:
+            now = time.perf_counter()
+            self.latencies.append(now - since)
+            if PROFILER.enabled:
+                PROFILER.record(name + " sfx", since, now)
+
+    def latency(self):
+        """p50 and p99 of input to play() and the buffer on top, in milliseconds."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        last = len(ordered) - 1
+        return {
+            "dispatch_p50": ordered[round(last * 0.50)] * 1000,
+            "dispatch_p99": ordered[round(last * 0.99)] * 1000,
+            "buffer": buffer_latency() * 1000,
+        }
+
+    # simulation.Game observer methods
+
+    def jumped(self, index):
+        self.play("jump", self.input_time)
+
+    def picked_up(self, index, obstacle):
+        self.play("powerup")
+
+    def crashed(self, index):
+        self.play("death")
+
+    def milestone(self, points):
+        self.play("milestone")
+
+
+AUDIO = Audio()
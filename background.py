@@ -0,0 +1,79 @@
+import random
+
+import pygame
+
+import resources
+from settings import SCREEN_WIDTH
+
+TRACK_Y = 380
+CLOUD_Y = 50
+CLOUD_TILE_WIDTH = 2 * SCREEN_WIDTH
+CLOUDS_PER_TILE = 2
+
+
+class ParallaxLayer:
+    """A horizontally tiling strip that scrolls at factor times the game speed.
+
+    The strip is pre-composed once, one screen plus one tile wide, so any
+    scroll offset is a single area-clipped blit of it. Its dark variant is
+    registered with resources.register().
+    """
+
+    def __init__(self, tile, y, factor):
+        self.tile_width = tile.get_width()
+        self.y = y
+        self.factor = factor
+        self.strip = pygame.Surface((SCREEN_WIDTH + self.tile_width, tile.get_height()), pygame.SRCALPHA)
+        for x in range(0, self.strip.get_width(), self.tile_width):
+            self.strip.blit(tile, (x, 0))
+        self.strip = self.strip.convert_alpha()
+        resources.register(self.strip, dark=resources.inverted(self.strip))
+        self.area = pygame.Rect(0, 0, SCREEN_WIDTH, tile.get_height())
+
+    def draw(self, screen, distance):
+        self.area.x = int(distance * self.factor) % self.tile_width
+        return screen.blit(resources.SKIN[self.strip], (0, self.y), self.area)
+
+
+def cloud_tile(seed=0):
+    """A tile with a few clouds spread along it, for a layer drawn at CLOUD_Y."""
+    rng = random.Random(seed)
+    image = resources.CLOUD
+    tile = pygame.Surface((CLOUD_TILE_WIDTH, 50 + image.get_height()), pygame.SRCALPHA)
+    slot = CLOUD_TILE_WIDTH // CLOUDS_PER_TILE
+    for index in range(CLOUDS_PER_TILE):
+        x = index * slot + rng.randint(0, slot - image.get_width())
+        tile.blit(image, (x, rng.randint(0, 50)))
+    return tile
+
+
+class Background:
+    """The scenery shared by every game loop.
+
+    Layers in back are drawn before the sprites, layers in front after them
+    (the track overlaps the dinosaur's feet). Both take the distance the game
+    has scrolled, so they can be drawn at an interpolated position.
+    """
+
+    def __init__(self):
+        self.back = [ParallaxLayer(cloud_tile(), CLOUD_Y, 0.5)]
+        self.front = [ParallaxLayer(resources.BG, TRACK_Y, 1.0)]
+
+    def draw_back(self, screen, distance):
+        for layer in self.back:
+            layer.draw(screen, distance)
+
+    def draw_front(self, screen, distance):
+        for layer in self.front:
+            layer.draw(screen, distance)
+
+
+# Filled in by load(), which needs the display and the sprites
+BACKGROUND = None
+
+
+def load():
+    global BACKGROUND
+    if BACKGROUND is None:
+        BACKGROUND = Background()
+    return BACKGROUND
@@ -0,0 +1,286 @@
+"""
+Vectorized single-player simulator for parameter sweeps.
+
+`BatchGame` keeps N independent games as NumPy arrays (structure of arrays)
+and advances all of them with one set of array operations per tick. The
+dinosaur follows `Dinosaur.step()` and the classic profile's jump arc step
+for step, including pygame's rounding when a float is stored in a Rect. Collisions are
+found as in `collision.collisions()`: a bounds test over every game at once,
+then a mask test for the few pairs it lets through. Jump velocity,
+gravity, scroll speed and bird heights can be given per game.
+
+Obstacles are scheduled like `obstacles.ObstacleManager`: one every
+MIN_GAP to MAX_GAP pixels scrolled, held in a fixed number of slots per game.
+They are drawn from NumPy's generator rather than `random.Random`, so a batch
+run has the same spawn odds as `simulation.Game` but not the same sequence
+for a given seed.
+"""
+import numpy as np
+
+import resources
+from dinosaur import Dinosaur, PROFILES, JUMP, DUCK
+from obstacles import Bird, MIN_GAP, MAX_GAP
+from settings import GAME_SPEED, SCREEN_WIDTH, TICK_RATE
+
+CLASSIC = PROFILES["classic"]
+NONE, SMALL_CACTUS, LARGE_CACTUS, BIRD, POWERUP, SPEEDUP = -1, 0, 1, 2, 3, 4
+OBSTACLE_SPRITES = ["SMALL_CACTUS", "LARGE_CACTUS", "BIRD", "POWERUP", "SPEEDUP"]
+# Dinosaur frames, as indexes into RUNNING + DUCKING + [JUMPING]
+RUN_FRAME, DUCK_FRAME, JUMP_FRAME = 0, 2, 4
+SPAWN_WEIGHTS = [25, 20, 16, 13, 10]  # the single player odds in simulation.MODES
+# Enough slots for every obstacle that can be on screen at once
+SLOTS = SCREEN_WIDTH // MIN_GAP + 2
+
+
+def round_rect(values):
+    """Round like pygame does when a float is assigned to a Rect field (half away from zero)."""
+    magnitude = np.abs(values)
+    floor = np.floor(magnitude)
+    return np.copysign(floor + (magnitude - floor >= 0.5), values)
+
+
+def sprite_frames(name):
+    if resources.ATLAS is None:
+        resources.load(headless=True)
+    sprites = getattr(resources, name)
+    return sprites if isinstance(sprites, list) else [sprites]
+
+
+def sprite_sizes(name):
+    return np.array([sprite.get_size() for sprite in sprite_frames(name)], dtype=np.int64)
+
+
+def sprite_masks(name):
+    return [resources.MASKS[sprite] for sprite in sprite_frames(name)]
+
+
+class BatchResult:
+    def __init__(self, ticks, score):
+        self.ticks = ticks
+        self.seconds = ticks / TICK_RATE
+        self.score = score
+
+
+class BatchGame:
+    """N single player games advanced in lockstep."""
+
+    def __init__(self, n, jump_vel=CLASSIC.jump_vel, gravity=CLASSIC.jump_decay,
+                 game_speed=GAME_SPEED, bird_heights=Bird.BIRD_HEIGHTS, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.jump_vel0 = np.broadcast_to(np.asarray(jump_vel, dtype=np.float64), (n,))
+        self.gravity = np.broadcast_to(np.asarray(gravity, dtype=np.float64), (n,))
+        self.game_speed = np.broadcast_to(np.asarray(game_speed, dtype=np.float64), (n,))
+        self.bird_heights = np.broadcast_to(np.asarray(bird_heights, dtype=np.int64),
+                                            (n, np.shape(bird_heights)[-1]))
+
+        self.run_sizes = sprite_sizes("RUNNING")
+        self.duck_sizes = sprite_sizes("DUCKING")
+        self.frame_sizes = np.concatenate([self.run_sizes, self.duck_sizes, sprite_sizes("JUMPING")])
+        self.frame_masks = sprite_masks("RUNNING") + sprite_masks("DUCKING") + sprite_masks("JUMPING")
+        self.obstacle_sizes = [sprite_sizes(name) for name in OBSTACLE_SPRITES]
+        self.obstacle_masks = [sprite_masks(name) for name in OBSTACLE_SPRITES]
+
+        # Dinosaur state, mirroring the attributes of Dinosaur
+        self.y = np.full(n, Dinosaur.Y_POS, dtype=np.float64)
+        self.w = np.full(n, self.run_sizes[0, 0], dtype=np.int64)
+        self.h = np.full(n, self.run_sizes[0, 1], dtype=np.int64)
+        self.jump_vel = self.jump_vel0.copy()
+        self.running = np.ones(n, dtype=bool)
+        self.ducking = np.zeros(n, dtype=bool)
+        self.jumping = np.zeros(n, dtype=bool)
+        self.step_index = np.zeros(n, dtype=np.int64)
+        self.frame = np.full(n, RUN_FRAME, dtype=np.int64)
+
+        # SLOTS obstacles per game; a free slot has kind NONE
+        self.obs_kind = np.full((n, SLOTS), NONE, dtype=np.int64)
+        self.obs_x = np.zeros((n, SLOTS), dtype=np.float64)
+        self.obs_y = np.zeros((n, SLOTS), dtype=np.int64)
+        self.obs_w = np.zeros((n, SLOTS), dtype=np.int64)
+        self.obs_h = np.zeros((n, SLOTS), dtype=np.int64)
+        self.obs_variant = np.zeros((n, SLOTS), dtype=np.int64)
+        self.obs_flap = np.zeros((n, SLOTS), dtype=np.int64)
+        self.distance = np.zeros(n, dtype=np.float64)
+        self.next_spawn = np.zeros(n, dtype=np.float64)
+
+        self.alive = np.ones(n, dtype=bool)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+
+    def step(self, actions):
+        """Advance every live game one tick. actions holds a JUMP/DUCK mask per game."""
+        alive = self.alive
+        actions = np.broadcast_to(np.asarray(actions, dtype=np.int64), (self.n,))
+        self.step_player(actions, alive)
+        self.spawn(alive)
+        self.collide(alive)
+        self.distance += np.where(self.alive, self.game_speed, 0)
+        self.ticks += self.alive
+        self.score += self.alive
+        return self.alive.any()
+
+    def step_player(self, actions, alive):
+        # Running takes over after a speedup, as in Dinosaur.step(), so a game
+        # either ducks or runs and one frame index serves both
+        self.ducking &= ~self.running
+        frame = self.step_index // 5
+
+        ducking = alive & self.ducking
+        self.w = np.where(ducking, self.duck_sizes[frame, 0], self.w)
+        self.h = np.where(ducking, self.duck_sizes[0, 1], self.h)
+        self.y = np.where(ducking, Dinosaur.Y_POS_DUCK, self.y)
+        self.frame = np.where(ducking, DUCK_FRAME + frame, self.frame)
+        self.step_index += ducking
+
+        running = alive & self.running
+        self.w = np.where(running, self.run_sizes[frame, 0], self.w)
+        self.h = np.where(running, self.run_sizes[0, 1], self.h)
+        self.y = np.where(running, Dinosaur.Y_POS, self.y)
+        self.frame = np.where(running, RUN_FRAME + frame, self.frame)
+        self.step_index += running
+
+        jumping = alive & self.jumping
+        self.frame = np.where(jumping, JUMP_FRAME, self.frame)
+        self.y = np.where(jumping, round_rect(self.y - self.jump_vel * CLASSIC.jump_scale), self.y)
+        self.jump_vel = np.where(jumping, self.jump_vel - self.gravity, self.jump_vel)
+        landed = jumping & (self.jump_vel < -self.jump_vel0)
+        self.jumping &= ~landed
+        self.jump_vel = np.where(landed, self.jump_vel0, self.jump_vel)
+
+        self.step_index[self.step_index >= 10] = 0
+
+        jump = alive & (actions & JUMP != 0) & ~self.jumping & (self.y <= Dinosaur.Y_POS)
+        duck = alive & ~jump & (actions & DUCK != 0) & ~self.jumping
+        run = alive & ~jump & ~duck & ~self.jumping & (actions & DUCK == 0)
+        self.jumping |= jump
+        self.ducking = np.where(jump | run, False, self.ducking | duck)
+        self.running = np.where(jump | duck, False, self.running | run)
+
+    def spawn(self, alive):
+        due = alive & (self.distance >= self.next_spawn)
+        if not due.any():
+            return
+        games = np.flatnonzero(due)
+        count = len(games)
+        self.next_spawn[games] = self.distance[games] + self.rng.integers(MIN_GAP, MAX_GAP + 1, count)
+
+        weights = np.asarray(SPAWN_WEIGHTS, dtype=np.float64)
+        kind = self.rng.choice(len(weights), count, p=weights / weights.sum())
+        variant = np.where((kind == SMALL_CACTUS) | (kind == LARGE_CACTUS), self.rng.integers(0, 3, count), 0)
+        height = self.bird_heights[games, self.rng.integers(0, self.bird_heights.shape[1], count)]
+        slot = np.argmax(self.obs_kind[games] == NONE, axis=1)
+
+        for index, sizes in enumerate(self.obstacle_sizes):
+            chosen = kind == index
+            self.obs_w[games[chosen], slot[chosen]] = sizes[variant[chosen], 0]
+            self.obs_h[games[chosen], slot[chosen]] = sizes[variant[chosen], 1]
+        self.obs_kind[games, slot] = kind
+        self.obs_variant[games, slot] = variant
+        self.obs_flap[games, slot] = 0
+        self.obs_x[games, slot] = SCREEN_WIDTH
+        self.obs_y[games, slot] = np.select([kind == SMALL_CACTUS, kind == LARGE_CACTUS], [325, 300], height)
+
+    def collide(self, alive):
+        active = alive[:, None] & (self.obs_kind != NONE)
+        flapping = active & (self.obs_kind == BIRD)
+        self.obs_flap = np.where(flapping, (self.obs_flap + 1) % 9, self.obs_flap)
+        self.obs_x = np.where(active, round_rect(self.obs_x - self.game_speed[:, None]), self.obs_x)
+        gone = active & (self.obs_x < -self.obs_w)
+        active &= ~gone
+
+        # Bounds of the frames drawn; a bird's rect covers both of its frames
+        x = Dinosaur.X_POS
+        y = self.y[:, None]
+        w = self.frame_sizes[self.frame, 0][:, None]
+        h = self.frame_sizes[self.frame, 1][:, None]
+        hit = (active
+               & (x < self.obs_x + self.obs_w) & (y < self.obs_y + self.obs_h)
+               & (x + w > self.obs_x) & (y + h > self.obs_y))
+        for game, slot in zip(*np.nonzero(hit)):
+            kind = self.obs_kind[game, slot]
+            frame = self.obs_flap[game, slot] // 5 if kind == BIRD else self.obs_variant[game, slot]
+            offset = (int(self.obs_x[game, slot]) - x, int(self.obs_y[game, slot] - self.y[game]))
+            if self.frame_masks[self.frame[game]].overlap(self.obstacle_masks[kind][frame], offset) is None:
+                hit[game, slot] = False
+        powerup = hit & (self.obs_kind == POWERUP)
+        speedup = hit & (self.obs_kind == SPEEDUP)
+        self.jump_vel = self.jump_vel + 5 * powerup.sum(axis=1)
+        self.running |= speedup.any(axis=1)
+        self.alive = alive & ~(hit & ~powerup & ~speedup).any(axis=1)
+        self.obs_kind[gone | powerup | speedup] = NONE
+
+    def run(self, policy=None, max_ticks=100000):
+        """Step until every game has crashed or max_ticks passed."""
+        for _ in range(max_ticks):
+            actions = 0 if policy is None else policy(self)
+            if not self.step(actions):
+                break
+        return BatchResult(self.ticks.copy(), self.score.copy())
+
+
+def reflex(distance=250):
+    """Vectorized policy: jump when the next obstacle is within distance pixels."""
+    def policy(batch):
+        gap = batch.obs_x - (Dinosaur.X_POS + batch.w)[:, None]
+        near = (batch.obs_kind != NONE) & (gap >= 0) & (gap < distance)
+        return np.where(near.any(axis=1), JUMP, 0)
+    return policy
+
+
+def check_player(games=1000, ticks=2000, seed=0, speedups=0.05):
+    """Step Dinosaurs and a batch's dinosaurs on the same random inputs and compare their rects.
+
+    A speedup is picked up at random, speedups of the time, whatever the
+    dinosaur is doing, ducking included. Returns the (tick, game) pairs
+    that differ.
+    """
+    rng = np.random.default_rng(seed)
+    batch = BatchGame(games, seed=seed)
+    dinosaurs = [Dinosaur() for _ in range(games)]
+    alive = np.ones(games, dtype=bool)
+    mismatches = []
+    for tick in range(ticks):
+        actions = rng.choice([0, 0, 0, JUMP, DUCK, DUCK], games)
+        batch.step_player(actions, alive)
+        for dinosaur, action in zip(dinosaurs, actions):
+            dinosaur.step(int(action))
+        # what Game.collide() and BatchGame.collide() do on a speedup
+        speedup = rng.random(games) < speedups
+        batch.running |= speedup
+        for game in np.flatnonzero(speedup):
+            dinosaurs[game].dino_run += 5
+        for game, dinosaur in enumerate(dinosaurs):
+            rect = dinosaur.dino_rect
+            if (rect.y, rect.width, rect.height) != (batch.y[game], batch.w[game], batch.h[game]):
+                mismatches.append((tick, game))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Sweep the jump velocity over a batch of headless games.")
+    parser.add_argument("--games", type=int, default=10000, help="games per jump velocity")
+    parser.add_argument("--jump-vel", type=float, nargs="+", default=[CLASSIC.jump_vel])
+    parser.add_argument("--max-ticks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true",
+                        help="compare the batch's dinosaurs with Dinosaur on random inputs and speedups")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_player(seed=args.seed)
+        print("%d mismatched ticks" % len(mismatches) + ("" if not mismatches else ", first at tick %d of game %d"
+                                                           % mismatches[0]))
+        raise SystemExit(1 if mismatches else 0)
+
+    jump_vel = np.repeat(args.jump_vel, args.games)
+    start = time.perf_counter()
+    result = BatchGame(len(jump_vel), jump_vel=jump_vel, seed=args.seed).run(reflex(), args.max_ticks)
+    elapsed = time.perf_counter() - start
+    for index, value in enumerate(args.jump_vel):
+        ticks = result.ticks[index * args.games:(index + 1) * args.games]
+        print("jump_vel %5.2f: mean %7.1f s, max %7.1f s"
+              % (value, ticks.mean() / TICK_RATE, ticks.max() / TICK_RATE))
+    print("%d game ticks in %.2f s" % (result.ticks.sum(), elapsed))
@@ -0,0 +1,319 @@
+"""
+Benchmarks for the game's hot paths, run headless.
+
+    python bench.py                       # run, print, write bench_results.json
+    python bench.py --save-baseline       # ... and keep the results as the baseline
+    python bench.py --threshold 0.15      # fail on anything 15% worse than the baseline
+
+Every benchmark runs under SDL's dummy video and audio drivers, on fixed
+seeds and fixed inputs, and keeps the best of a few repeats, so runs on the
+same machine are comparable. Results are written as JSON. When a baseline
+file exists each metric is compared against it and the run exits with
+status 1 if any got worse by more than the threshold.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pygame
+
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+THRESHOLD = 0.10
+REPEATS = 3
+
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def best_rate(function, count, repeats=REPEATS):
+    """Calls of function per second, best of repeats runs of count calls."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(count):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def setup():
+    import main
+    if not pygame.get_init():
+        main.init(audio=False, leaderboard=None)
+    return main
+
+
+@benchmark
+def simulation(scale):
+    """Game.step() ticks per second, jumping every 40 ticks and restarting after crashes."""
+    from simulation import Game
+    from dinosaur import JUMP
+
+    setup()
+    state = {"game": None, "seed": 0}
+
+    def tick():
+        game = state["game"]
+        if game is None or game.game_over:
+            state["seed"] += 1
+            game = state["game"] = Game("coop", state["seed"])
+        action = JUMP if game.ticks % 40 == 0 else 0
+        game.step([action, action])
+
+    return {"sim_ticks_per_second": metric(best_rate(tick, 20000 * scale), "ticks/s", "higher")}
+
+
+@benchmark
+def blits(scale):
+    """Sprite blits per second onto the display, as loaded and after convert_alpha()."""
+    import resources
+
+    setup()
+    screen = pygame.display.get_surface()
+    paths = resources.atlas_sources()
+    raw = [pygame.image.load(path) for path in paths]
+    converted = [image.convert_alpha() for image in raw]
+    results = {}
+    for name, images in (("raw", raw), ("convert_alpha", converted)):
+        def blit_all():
+            for image in images:
+                screen.blit(image, (100, 100))
+        rate = best_rate(blit_all, 200 * scale) * len(images)
+        results["blits_per_second_%s" % name] = metric(rate, "blits/s", "higher")
+    return results
+
+
+@benchmark
+def present(scale):
+    """Game frames drawn and presented per second, full screen against dirty rects."""
+    import background
+    from renderer import Renderer
+    from simulation import Game
+
+    setup()
+    screen = pygame.display.get_surface()
+    results = {}
+    for name, dirty in (("full", False), ("dirty", True)):
+        renderer = Renderer(screen, dirty)
+        state = {"game": Game("single", 1)}
+
+        def frame():
+            game = state["game"]
+            if game.game_over:
+                game = state["game"] = Game("single", 1)
+            game.step([0])
+            renderer.begin((255, 255, 255))
+            background.BACKGROUND.draw_back(renderer, game.distance)
+            for player in game.players:
+                player.draw(renderer)
+            for obstacle in game.obstacles:
+                obstacle.draw(renderer)
+            background.BACKGROUND.draw_front(renderer, game.distance)
+            renderer.present()
+
+        results["frames_per_second_%s" % name] = metric(best_rate(frame, 200 * scale), "frames/s", "higher")
+        results["pixels_per_frame_%s" % name] = metric(renderer.pixels, "pixels", "lower")
+    return results
+
+
+@benchmark
+def leaderboard(scale):
+    """What a finished game costs the game loop, and the top 100 of a mode from a big leaderboard."""
+    import random
+    from scores import LEADERBOARD_FILE, MODES, Leaderboard
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        board = Leaderboard().open(os.path.join(directory, LEADERBOARD_FILE))
+
+        def record():
+            board.record("player%d" % rng.randrange(1000), rng.choice(MODES), rng.randrange(5000), 60.0, 0)
+
+        def top():
+            board.top("single", 100)
+
+        record_us = 1e6 / best_rate(record, 20000 * scale)
+        board.flush()
+        results = {
+            "leaderboard_record_us": metric(record_us, "us", "lower"),
+            "leaderboard_top100_ms": metric(1e3 / best_rate(top, 200 * scale), "ms", "lower"),
+        }
+        board.close()
+        return results
+
+
+@benchmark
+def menu(scale):
+    """Time to draw and present one frame of the title menu."""
+    from scenes import Menu, SceneManager
+
+    setup()
+    manager = SceneManager()
+    scene = Menu(manager)
+    down = [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN)]
+
+    def frame():
+        scene.update(down)  # moves the selection and asks for a redraw, as pressing down does
+        scene.draw()
+        scene.present()
+
+    return {"menu_frame_ms": metric(1000 / best_rate(frame, 100 * scale), "ms", "lower")}
+
+
+@benchmark
+def audio(scale):
+    """Cost of starting a sound effect, and the delay from a jump on a tick to hearing it."""
+    from audio import AUDIO, buffer_latency
+    from simulation import Game
+    from dinosaur import JUMP
+
+    setup()
+    if not AUDIO.enabled and not AUDIO.init(music=None):
+        return {}
+    game = Game("single", 1)
+    game.observer = AUDIO
+    latencies = AUDIO.latencies
+    latencies.clear()
+    for tick in range(600 * scale):
+        AUDIO.input_time = time.perf_counter()
+        if not game.step([JUMP if tick % 40 == 0 else 0]):
+            game = Game("single", tick)
+            game.observer = AUDIO
+    dispatch = sorted(latencies)[round((len(latencies) - 1) * 0.99)]
+    return {
+        "sfx_play_us": metric(1e6 / best_rate(lambda: AUDIO.play("jump"), 2000 * scale), "us", "lower"),
+        "jump_sound_latency_ms": metric((dispatch + buffer_latency()) * 1000, "ms", "lower"),
+    }
+
+
+STARTUP_SCRIPT = """
+import sys
+import time
+start = time.perf_counter()
+import main, background, pygame
+main.init(audio=False, leaderboard=sys.argv[1])
+screen = pygame.display.get_surface()
+screen.fill((255, 255, 255))
+background.BACKGROUND.draw_back(screen, 0)
+background.BACKGROUND.draw_front(screen, 0)
+pygame.display.update()
+print(time.perf_counter() - start)
+"""
+
+
+@benchmark
+def startup(scale):
+    """Milliseconds from `import main` to the first presented frame, in a fresh interpreter, best of a few."""
+    from scores import LEADERBOARD_FILE
+
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    times = []
+    with tempfile.TemporaryDirectory() as directory:
+        leaderboard = os.path.join(directory, LEADERBOARD_FILE)  # not the player's own
+        for _ in range(REPEATS):
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, leaderboard], env=env, check=True,
+                                    capture_output=True, text=True).stdout
+            times.append(float(output.split()[-1]))
+    return {"startup_ms": metric(min(times) * 1000, "ms", "lower")}
+
+
+def run(names, scale=1):
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        results.update(BENCHMARKS[name](scale))
+        print("%-12s done in %.1f s" % (name, time.perf_counter() - start), file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Rows of (name, baseline, current, change, regressed) for the metrics both runs have.
+
+    change is relative and positive when the metric got better.
+    """
+    rows = []
+    for name, current in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or not old["value"]:
+            continue
+        change = (current["value"] - old["value"]) / old["value"]
+        if current["better"] == "lower":
+            change = -change
+        rows.append((name, old["value"], current["value"], change, change < -threshold))
+    return rows
+
+
+def table(results, rows=None):
+    lines = []
+    if rows is None:
+        for name, result in results["results"].items():
+            lines.append("%-32s %14.2f %s" % (name, result["value"], result["unit"]))
+    else:
+        lines.append("%-32s %14s %14s %8s" % ("metric", "baseline", "current", "change"))
+        for name, old, new, change, regressed in rows:
+            lines.append("%-32s %14.2f %14.2f %+7.1f%%%s"
+                         % (name, old, new, change * 100, "  REGRESSION" if regressed else ""))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths headless.")
+    parser.add_argument("benchmarks", nargs="*", help="any of %s (default: all)" % ", ".join(BENCHMARKS))
+    parser.add_argument("--out", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="relative slowdown that counts as a regression (default: %(default)s)")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the work per benchmark")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmark(s): %s" % ", ".join(sorted(unknown)))
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # the assets are found relative to here
+    results = run(args.benchmarks or list(BENCHMARKS), args.scale)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    regressions = 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(table(results))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.threshold)
+        print(table(results, rows))
+        regressions = sum(row[-1] for row in rows)
+        if regressions:
+            print("%d metric(s) regressed by more than %.0f%%" % (regressions, args.threshold * 100))
+    else:
+        print(table(results))
+    raise SystemExit(1 if regressions else 0)
@@ -0,0 +1,60 @@
+"""
+Collision detection between players and obstacles.
+
+The broad phase sorts the bounds of every sprite by their left edge and
+sweeps along x, the axis everything scrolls on, so only a player and an
+obstacle whose bounds overlap are ever paired up (sweep and prune). The
+narrow phase then compares the `pygame.mask` bitmaps of the frames being
+drawn, cached in `resources.MASKS`, so the transparent corners of a cactus
+or a bird no longer count as a hit.
+"""
+import pygame
+
+import resources
+
+PLAYER = 0
+OBSTACLE = 1
+
+
+def bounds(rect, image):
+    """The area image covers when drawn at rect."""
+    return pygame.Rect(rect.topleft, image.get_size())
+
+
+def broad_phase(players, obstacles):
+    """(player index, obstacle index) pairs whose bounds overlap, by obstacle then player."""
+    if not obstacles:
+        return []
+    boxes = [(bounds(player.dino_rect, player.image), PLAYER, index) for index, player in enumerate(players)]
+    boxes += [(bounds(obstacle.rect, obstacle.sprite()), OBSTACLE, index) for index, obstacle in enumerate(obstacles)]
+    boxes.sort(key=lambda box: box[0].x)
+
+    pairs = []
+    open_boxes = []
+    for box in boxes:
+        rect, side, index = box
+        # Boxes that end left of this one can't touch it or anything after it
+        open_boxes = [other for other in open_boxes if other[0].right > rect.x]
+        for other_rect, other_side, other_index in open_boxes:
+            if other_side != side and rect.colliderect(other_rect):
+                pairs.append((index, other_index) if side == PLAYER else (other_index, index))
+        open_boxes.append(box)
+    pairs.sort(key=lambda pair: (pair[1], pair[0]))
+    return pairs
+
+
+def overlap(rect, image, other_rect, other_image):
+    """Whether the opaque pixels of two sprites drawn at rect and other_rect touch."""
+    offset = (other_rect.x - rect.x, other_rect.y - rect.y)
+    return resources.MASKS[image].overlap(resources.MASKS[other_image], offset) is not None
+
+
+def collisions(players, obstacles):
+    """(player index, obstacle) for every player touching an obstacle, by obstacle then player."""
+    hits = []
+    for player_index, obstacle_index in broad_phase(players, obstacles):
+        player = players[player_index]
+        obstacle = obstacles[obstacle_index]
+        if overlap(player.dino_rect, player.image, obstacle.rect, obstacle.sprite()):
+            hits.append((player_index, obstacle))
+    return hits
@@ -0,0 +1,252 @@
+"""
+Keyboard and gamepad input, turned into per-player JUMP/DUCK bitmasks.
+
+Controls follows KEYDOWN/KEYUP and joystick events instead of polling
+pygame.key.get_pressed() once a frame, and sample() is called once per game
+tick. So every player reads only their own bindings, and a key that is
+pressed and released between two ticks still acts for one. A jump pressed
+shortly before it can happen (mid-air, or while getting up from a duck) is
+buffered for JUMP_BUFFER ticks and happens as soon as it can.
+
+pygame's events carry no timestamp, so each one is stamped when the frame
+reads it from the queue. The time from that stamp to the tick the action
+is applied on is kept as input-to-action latency (latency(), and "input
+lag" in the profiler).
+
+Bindings default to dinosaur.KEYMAPS and can be changed in CONTROLS_FILE:
+
+    {
+        "players": [
+            {"jump": ["up", "space"], "duck": ["down"], "pad": 0},
+            {"jump": ["w"], "duck": ["s"], "pad": 1}
+        ],
+        "pad_buttons": {"jump": [0, 3], "duck": [1]},
+        "jump_buffer": 6
+    }
+
+Keys are pygame.key.name() names. "pad" is the gamepad a player uses, by
+the order they were connected; its stick, its hat and the buttons in
+"pad_buttons" jump (up) and duck (down). `python controls.py` prints the
+bindings in use; `python controls.py --write` saves them to the file to
+edit.
+"""
+import argparse
+import json
+import os
+from collections import deque
+
+import pygame
+
+from dinosaur import DUCK, JUMP, KEYMAPS
+from profiler import PROFILER
+
+CONTROLS_FILE = "controls.json"
+JUMP_BUFFER = 6  # ticks a jump press waits for the player to be able to jump
+PAD_BUTTONS = {"jump": [0, 3], "duck": [1]}
+PAD_AXIS = 1  # the left stick's vertical axis
+PAD_DEADZONE = 0.5
+LATENCY_SAMPLES = 600
+ACTIONS = {"jump": JUMP, "duck": DUCK}
+
+
+class Seat:
+    """The input state of one player."""
+
+    __slots__ = ("keys", "pad", "jump_buffer", "down", "pad_held", "pressed", "buffer", "press_time")
+
+    def __init__(self, keys, pad=None, jump_buffer=JUMP_BUFFER):
+        self.keys = keys  # {key: action bit}
+        self.pad = pad
+        self.jump_buffer = jump_buffer
+        self.down = {}  # held key -> action bit
+        self.pad_held = 0
+        self.pressed = 0  # bits pressed since the last tick
+        self.buffer = 0  # ticks left on a buffered jump
+        self.press_time = None  # stamp of the oldest press not yet acted on
+
+    def held(self):
+        bits = self.pad_held
+        for bit in self.down.values():
+            bits |= bit
+        return bits
+
+    def press(self, bit, now):
+        self.pressed |= bit
+        if bit & JUMP:
+            self.buffer = self.jump_buffer
+        if self.press_time is None:
+            self.press_time = now
+
+    def release_all(self):
+        self.down.clear()
+        self.pad_held = 0
+
+
+def default_config():
+    return {
+        "players": [{"jump": [pygame.key.name(key) for key in keymap.jump],
+                     "duck": [pygame.key.name(key) for key in keymap.duck],
+                     "pad": index}
+                    for index, keymap in enumerate(KEYMAPS)],
+        "pad_buttons": PAD_BUTTONS,
+        "jump_buffer": JUMP_BUFFER,
+    }
+
+
+def key_code(name, path):
+    try:
+        return pygame.key.key_code(name)
+    except ValueError:
+        raise ValueError("%s: unknown key %r" % (path, name)) from None
+
+
+class Controls:
+    """Every player's bindings and input state, fed by the frame's events."""
+
+    def __init__(self):
+        self.seats = []
+        self.keys = {}  # key -> [(seat, bit)]
+        self.pads = {}  # joystick instance id -> (Joystick, pad number)
+        self.pad_buttons = {}
+        self.jump_buffer = JUMP_BUFFER
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.jump_time = None  # stamp of the press behind a jump in the last sample(), if any
+        self.config = None
+
+    def load(self, path=CONTROLS_FILE):
+        """Read the bindings from path, falling back to the defaults for anything not in it."""
+        config = default_config()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                loaded = json.load(f)
+            for default, player in zip(config["players"], loaded.get("players", [])):
+                default.update(player)
+            config["pad_buttons"] = dict(config["pad_buttons"], **loaded.get("pad_buttons", {}))
+            config["jump_buffer"] = loaded.get("jump_buffer", config["jump_buffer"])
+        self.config = config
+        self.jump_buffer = config["jump_buffer"]
+        self.seats = []
+        self.keys = {}
+        for player in config["players"]:
+            keys = {key_code(name, path): ACTIONS[action]
+                    for action in ACTIONS for name in player[action]}
+            seat = Seat(keys, player.get("pad"), self.jump_buffer)
+            self.seats.append(seat)
+            for key, bit in keys.items():
+                self.keys.setdefault(key, []).append((seat, bit))
+        self.pad_buttons = {button: ACTIONS[action]
+                            for action, buttons in config["pad_buttons"].items() for button in buttons}
+        return self
+
+    def save(self, path=CONTROLS_FILE):
+        with open(path, "w") as f:
+            json.dump(self.config or default_config(), f, indent=4)
+
+    def reset(self):
+        """Forget presses and buffered jumps, e.g. when a new game starts. Held keys stay held."""
+        for seat in self.seats:
+            seat.pressed = seat.buffer = 0
+            seat.press_time = None
+
+    def handle(self, event, now):
+        """Update the seats from one event, read from the queue at time now."""
+        kind = event.type
+        if kind == pygame.KEYDOWN:
+            for seat, bit in self.keys.get(event.key, ()):
+                seat.down[event.key] = bit
+                seat.press(bit, now)
+        elif kind == pygame.KEYUP:
+            for seat, bit in self.keys.get(event.key, ()):
+                seat.down.pop(event.key, None)
+        elif kind == pygame.WINDOWFOCUSLOST:
+            # The key ups go to whichever window has focus now
+            for seat in self.seats:
+                seat.release_all()
+        elif kind == pygame.JOYDEVICEADDED:
+            joystick = pygame.joystick.Joystick(event.device_index)
+            numbers = {number for _, number in self.pads.values()}
+            number = min(set(range(len(numbers) + 1)) - numbers)
+            self.pads[joystick.get_instance_id()] = (joystick, number)
+        elif kind == pygame.JOYDEVICEREMOVED:
+            _, number = self.pads.pop(event.instance_id, (None, None))
+            for seat in self.seats:
+                if seat.pad == number:
+                    seat.pad_held = 0
+        elif kind in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION, pygame.JOYAXISMOTION):
+            self.handle_pad(event, now)
+
+    def handle_pad(self, event, now):
+        pad = self.pads.get(event.instance_id)
+        if pad is None:
+            return
+        for seat in self.seats:
+            if seat.pad != pad[1]:
+                continue
+            if event.type == pygame.JOYBUTTONDOWN:
+                bit = self.pad_buttons.get(event.button, 0)
+                seat.pad_held |= bit
+                if bit:
+                    seat.press(bit, now)
+            elif event.type == pygame.JOYBUTTONUP:
+                seat.pad_held &= ~self.pad_buttons.get(event.button, 0)
+            else:
+                if event.type == pygame.JOYHATMOTION:
+                    y = event.value[1]  # up is +1
+                elif event.axis == PAD_AXIS:
+                    y = -event.value  # up is -1
+                else:
+                    continue
+                bits = JUMP if y > PAD_DEADZONE else DUCK if y < -PAD_DEADZONE else 0
+                new = bits & ~seat.pad_held
+                seat.pad_held = seat.pad_held & ~(JUMP | DUCK) | bits
+                if new:
+                    seat.press(new, now)
+
+    def sample(self, players, now):
+        """The actions of each player for the next tick, as of time now."""
+        actions = []
+        self.jump_time = None
+        for seat, player in zip(self.seats, players):
+            bits = seat.held() | seat.pressed
+            seat.pressed = 0
+            if seat.buffer:
+                if player.dino_jump and player.arc_tick == 0:
+                    seat.buffer = 0  # a jump started on the last tick
+                else:
+                    bits |= JUMP
+                    seat.buffer -= 1
+            if seat.press_time is not None and bits:
+                if bits & JUMP:
+                    self.jump_time = seat.press_time
+                self.latencies.append(now - seat.press_time)
+                if PROFILER.enabled:
+                    PROFILER.record("input lag", seat.press_time, now)
+                seat.press_time = None
+            actions.append(bits)
+        return actions
+
+    def latency(self):
+        """p50 and p99 of the time from an input event to the tick it acts on, in milliseconds."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        last = len(ordered) - 1
+        return {"p50": ordered[round(last * 0.50)] * 1000, "p99": ordered[round(last * 0.99)] * 1000}
+
+
+CONTROLS = Controls()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or save the key and gamepad bindings.")
+    parser.add_argument("--write", action="store_true", help="save the bindings in use to %s" % CONTROLS_FILE)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    CONTROLS.load()
+    if args.write:
+        CONTROLS.save()
+    for index, player in enumerate(CONTROLS.config["players"]):
+        print("player %d: jump %s, duck %s, pad %s"
+              % (index + 1, "/".join(player["jump"]), "/".join(player["duck"]), player.get("pad")))
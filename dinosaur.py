@@ -1,103 +1,216 @@
 import pygame
-from resources import DUCKING, RUNNING, JUMPING
+import resources
+from settings import GAME_SPEED, TICK_RATE
 
-class Dinosaur:
+# Per-tick player actions, as a bitmask. The simulation only ever sees these.
+JUMP = 1
+DUCK = 2
 
-    X_POS = 280
-    Y_POS = 310
-    Y_POS_DUCK = 340
-    JUMP_VEL = 8.5
 
-    def __init__(self):
-        self.duck_img = DUCKING
-        self.run_img = RUNNING
-        self.jump_img = JUMPING
+class Keymap:
+    """The keys one player jumps and ducks with."""
 
-        self.dino_duck = False
-        self.dino_run = True
-        self.dino_jump = False
+    __slots__ = ("jump", "duck")
 
-        self.step_index = 0
-        self.jump_vel = self.JUMP_VEL
-        self.image = self.run_img[0]
-        self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
-        self.dino_rect.y = self.Y_POS
+    def __init__(self, jump, duck):
+        self.jump = jump
+        self.duck = duck
 
-    def update(self, userInput):
-        if self.dino_duck:
-            self.duck()
-        if self.dino_run:
-            self.run()
-        if self.dino_jump:
-            self.jump()
+    def actions(self, pressed):
+        """Turn a pygame.key.get_pressed() array into JUMP/DUCK bits."""
+        actions = 0
+        for key in self.jump:
+            if pressed[key]:
+                actions |= JUMP
+        for key in self.duck:
+            if pressed[key]:
+                actions |= DUCK
+        return actions
 
-        if self.step_index >= 10:
-            self.step_index = 0
 
-        if (userInput[pygame.K_UP] or userInput[pygame.K_SPACE]) and not self.dino_jump and self.dino_rect.y <= 310:
-            self.dino_duck = False
-            self.dino_run = False
-            self.dino_jump = True
-        elif userInput[pygame.K_DOWN] and not self.dino_jump:
-            self.dino_duck = True
-            self.dino_run = False
-            self.dino_jump = False
-        elif not (self.dino_jump or userInput[pygame.K_DOWN]):
-            self.dino_duck = False
-            self.dino_run = True
-            self.dino_jump = False
+class JumpTable:
+    """The heights of one jump arc, with the highest and lowest point over every span of it.
 
-    def duck(self):
-        self.image = self.duck_img[self.step_index // 5]
-        self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
-        self.dino_rect.y = self.Y_POS_DUCK
-        self.step_index += 1
+    top[i][j] and bottom[i][j] are the smallest and largest y from tick i to
+    tick j of the jump, so any window of the jump is a single lookup.
+    """
 
-    def run(self):
-        self.image = self.run_img[self.step_index // 5]
-        self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
-        self.dino_rect.y = self.Y_POS
-        self.step_index += 1
+    __slots__ = ("ys", "top", "bottom")
 
-    def jump(self):
-        self.image = self.jump_img
-        if self.dino_jump:
-            self.dino_rect.y -= self.jump_vel * 5
-            self.jump_vel -= 0.8
-        if self.jump_vel < -self.JUMP_VEL:
-            self.dino_jump = False
-            self.jump_vel = self.JUMP_VEL
+    def __init__(self, arc):
+        self.ys = [y for y, _ in arc]
+        self.top = []
+        self.bottom = []
+        for start in range(len(self.ys)):
+            top = []
+            bottom = []
+            for y in self.ys[start:]:
+                top.append(min(y, top[-1]) if top else y)
+                bottom.append(max(y, bottom[-1]) if bottom else y)
+            self.top.append([None] * start + top)
+            self.bottom.append([None] * start + bottom)
 
-    def draw(self, SCREEN):
-        SCREEN.blit(self.image, (self.dino_rect.x, self.dino_rect.y))
 
-class Dinosaur2:
+def overlap_ticks(box, rect, speed):
+    """First and last tick from now on which rect, moving left speed pixels a tick, overlaps box along x.
 
-    X_POS = 260
+    Tick 0 is the next Game.step(). Obstacles scroll before collisions are
+    checked, so on tick j rect has moved speed * (j + 1) pixels. first > last
+    when it never overlaps.
+    """
+    first = max(0, (rect.x - box.right) // speed)
+    last = -((box.x - rect.right) // speed) - 2
+    return first, last
+
+
+class Profile:
+    """How high and how fast a player jumps.
+
+    Speeds are given per second like the rest of the game; jump_vel and
+    jump_decay are the same per tick, in the units of jump_scale pixels that
+    the arcs are integrated in. Arcs and their JumpTables are worked out once
+    per starting height and velocity and shared by every player with this
+    profile; the jump from the ground at jump_vel is ready when the profile
+    is made.
+    """
+
+    __slots__ = ("jump_scale", "jump_speed", "gravity", "jump_vel", "jump_decay", "arcs", "tables", "_rect")
+
+    def __init__(self, jump_scale, jump_speed, gravity):
+        self.jump_scale = jump_scale
+        self.jump_speed = jump_speed  # pixels per second at take-off
+        self.gravity = gravity  # pixels per second squared
+        self.jump_vel = jump_speed / (jump_scale * TICK_RATE)
+        self.jump_decay = gravity / (jump_scale * TICK_RATE ** 2)
+        self.arcs = {}
+        self.tables = {}
+        self._rect = pygame.Rect(0, 0, 0, 0)
+        self.table(Dinosaur.Y_POS, self.jump_vel)
+
+    def arc(self, y, vel):
+        """(y, velocity) after each tick of a jump from y at vel, up to the tick it lands on.
+
+        y is stored in a Rect on every tick, so it is rounded the way pygame
+        rounds, exactly as when the jump was integrated in place.
+        """
+        key = (y, vel)
+        arc = self.arcs.get(key)
+        if arc is None:
+            arc = []
+            rect = self._rect
+            rect.y = y
+            while True:
+                rect.y -= vel * self.jump_scale
+                vel -= self.jump_decay
+                arc.append((rect.y, vel))
+                if vel < -self.jump_vel:
+                    break
+            self.arcs[key] = arc = tuple(arc)
+        return arc
+
+    def table(self, y, vel):
+        """The JumpTable of arc(y, vel)."""
+        key = (y, vel)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = JumpTable(self.arc(y, vel))
+        return table
+
+    def clears(self, t, box, rect, speed=GAME_SPEED, vel=None):
+        """Whether a player at box, running on the ground, gets past rect by jumping on tick t.
+
+        rect is an obstacle moving left speed pixels a tick, and both are
+        given as they are now; t counts ticks like overlap_ticks(), and
+        t=None means not jumping at all. The answer takes a fixed number of
+        lookups however far away rect is. Bounds are compared, as in
+        collision.broad_phase(), so a jump this says clears never hits; one
+        that only clears by passing over on some ticks and under on others
+        counts as a hit.
+        """
+        first, last = overlap_ticks(box, rect, speed)
+        if first > last:
+            return True
+        on_ground = box.bottom <= rect.top or box.top >= rect.bottom
+        if t is None:
+            return on_ground
+
+        # The jump is pressed on tick t and moves the player from tick t + 1
+        table = self.table(box.y, self.jump_vel if vel is None else vel)
+        start = t + 1
+        end = t + len(table.ys)
+        if (first < start or last > end) and not on_ground:
+            return False
+        first = max(first, start) - start
+        last = min(last, end) - start
+        if first > last:
+            return True
+        return (table.bottom[first][last] + box.height <= rect.top
+                or table.top[first][last] >= rect.bottom)
+
+    def survivable(self, box, rect, speed=GAME_SPEED, vel=None):
+        """Whether a player at box can get past rect at all, by staying down or jumping on some tick."""
+        first, last = overlap_ticks(box, rect, speed)
+        return (self.clears(None, box, rect, speed, vel)
+                or any(self.clears(t, box, rect, speed, vel) for t in range(last + 1)))
+
+
+class Dinosaur:
+    """One player, placed at x and driven by a keymap and a physics profile."""
+
+    __slots__ = ("x", "keymap", "profile", "duck_img", "run_img", "jump_img",
+                 "dino_duck", "dino_run", "dino_jump", "step_index", "jump_vel",
+                 "image", "dino_rect", "prev_y", "arc", "arc_tick")
+
+    X_POS = 280
     Y_POS = 310
     Y_POS_DUCK = 340
-    JUMP_VEL = 8.5
+    X_SPACING = 20  # each further player stands this much behind the one before
 
-    def __init__(self):
-        self.duck_img = DUCKING
-        self.run_img = RUNNING
-        self.jump_img = JUMPING
+    def __init__(self, x=X_POS, keymap=None, profile=None):
+        self.x = x
+        self.keymap = keymap or KEYMAPS[0]
+        self.profile = profile or PROFILES["classic"]
+        self.duck_img = resources.DUCKING
+        self.run_img = resources.RUNNING
+        self.jump_img = resources.JUMPING
 
         self.dino_duck = False
         self.dino_run = True
         self.dino_jump = False
 
         self.step_index = 0
-        self.jump_vel = self.JUMP_VEL
+        self.jump_vel = self.profile.jump_vel
         self.image = self.run_img[0]
         self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
+        self.dino_rect.x = self.x
         self.dino_rect.y = self.Y_POS
+        self.prev_y = self.Y_POS
+        self.arc = ()
+        self.arc_tick = 0
+
+    def save(self):
+        """Everything about this player that changes from tick to tick, for load()."""
+        return (self.dino_duck, self.dino_run, self.dino_jump, self.step_index, self.jump_vel,
+                self.image, tuple(self.dino_rect), self.prev_y, self.arc, self.arc_tick)
+
+    def load(self, state):
+        (self.dino_duck, self.dino_run, self.dino_jump, self.step_index, self.jump_vel,
+         self.image, rect, self.prev_y, self.arc, self.arc_tick) = state
+        self.dino_rect.update(rect)
+
+    def read_input(self, userInput):
+        """Turn a pygame.key.get_pressed() array into JUMP/DUCK bits."""
+        return self.keymap.actions(userInput)
 
     def update(self, userInput):
+        self.step(self.read_input(userInput))
+
+    def step(self, actions):
+        self.prev_y = self.dino_rect.y
+        if self.dino_run:
+            # A speedup picked up while ducking: running takes over, or the
+            # two poses would walk step_index past the run frames
+            self.dino_duck = False
         if self.dino_duck:
             self.duck()
         if self.dino_run:
@@ -108,41 +221,95 @@ class Dinosaur2:
         if self.step_index >= 10:
             self.step_index = 0
 
-        if (userInput[pygame.K_w] or userInput[pygame.K_w]) and not self.dino_jump and self.dino_rect.y <= 310:
+        if actions & JUMP and not self.dino_jump and self.dino_rect.y <= 310:
             self.dino_duck = False
             self.dino_run = False
             self.dino_jump = True
-        elif userInput[pygame.K_s] and not self.dino_jump:
+            self.arc = self.profile.arc(self.dino_rect.y, self.jump_vel)
+            self.arc_tick = 0
+        elif actions & DUCK and not self.dino_jump:
             self.dino_duck = True
             self.dino_run = False
             self.dino_jump = False
-        elif not (self.dino_jump):
+        elif not (self.dino_jump or actions & DUCK):
             self.dino_duck = False
             self.dino_run = True
             self.dino_jump = False
 
+    def boost(self, amount):
+        """Add amount to the jump velocity, mid-jump or for the next jump."""
+        self.jump_vel += amount
+        if self.dino_jump:
+            self.arc = self.profile.arc(self.dino_rect.y, self.jump_vel)
+            self.arc_tick = 0
+
+    def ground_box(self):
+        """The area the player covers while running, wide enough for every running and jumping frame."""
+        width = max(image.get_width() for image in self.run_img + [self.jump_img])
+        return pygame.Rect(self.x, self.Y_POS, width, self.run_img[0].get_height())
+
+    def clears(self, rect, speed=GAME_SPEED, t=0):
+        """Profile.clears() for this player, who must be running, with its current jump velocity."""
+        return self.profile.clears(t, self.ground_box(), rect, speed, self.jump_vel)
+
     def duck(self):
-        self.image = self.duck_img[self.step_index // 5]
-        self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
-        self.dino_rect.y = self.Y_POS_DUCK
+        self.pose(self.duck_img[self.step_index // 5], self.Y_POS_DUCK)
         self.step_index += 1
 
     def run(self):
-        self.image = self.run_img[self.step_index // 5]
-        self.dino_rect = self.image.get_rect()
-        self.dino_rect.x = self.X_POS
-        self.dino_rect.y = self.Y_POS
+        self.pose(self.run_img[self.step_index // 5], self.Y_POS)
         self.step_index += 1
 
+    def pose(self, image, y):
+        self.image = image
+        self.dino_rect.size = image.get_size()
+        self.dino_rect.x = self.x
+        self.dino_rect.y = y
+
     def jump(self):
         self.image = self.jump_img
-        if self.dino_jump:
-            self.dino_rect.y -= self.jump_vel * 4
-            self.jump_vel -= 0.8
-        if self.jump_vel < -self.JUMP_VEL:
+        if self.dino_run:
+            # A speedup leaves the run pose on mid-jump, which puts the
+            # dinosaur back on the ground every tick; carry on from there
+            self.arc = self.profile.arc(self.dino_rect.y, self.jump_vel)
+            self.arc_tick = 0
+        self.dino_rect.y, self.jump_vel = self.arc[self.arc_tick]
+        self.arc_tick += 1
+        if self.arc_tick == len(self.arc):
             self.dino_jump = False
-            self.jump_vel = self.JUMP_VEL
+            self.jump_vel = self.profile.jump_vel
+
+    def draw(self, SCREEN, alpha=1.0):
+        """Draw alpha of the way from the previous tick's position to the current one."""
+        y = self.prev_y + (self.dino_rect.y - self.prev_y) * alpha
+        SCREEN.blit(resources.SKIN[self.image], (self.dino_rect.x, y))
+
+
+PROFILES = {
+    "classic": Profile(jump_scale=5, jump_speed=2550, gravity=14400),
+    "light": Profile(jump_scale=4, jump_speed=2040, gravity=11520),
+}
+
+# One keymap per seat at the keyboard; also the most players a local game can have
+KEYMAPS = [
+    Keymap((pygame.K_UP, pygame.K_SPACE), (pygame.K_DOWN,)),
+    Keymap((pygame.K_w,), (pygame.K_s,)),
+    Keymap((pygame.K_i,), (pygame.K_k,)),
+    Keymap((pygame.K_KP8,), (pygame.K_KP5,)),
+    Keymap((pygame.K_t,), (pygame.K_g,)),
+    Keymap((pygame.K_HOME,), (pygame.K_END,)),
+    Keymap((pygame.K_1,), (pygame.K_q,)),
+    Keymap((pygame.K_0,), (pygame.K_o,)),  # p and u pause and unpause
+]
+MAX_PLAYERS = len(KEYMAPS)
+
+
+def player(index, profile=None):
+    """The player in seat index, with that seat's keymap.
 
-    def draw(self, SCREEN):
-        SCREEN.blit(self.image, (self.dino_rect.x, self.dino_rect.y))
\ No newline at end of file
+    Seats alternate between the classic and the light profile, as the first
+    and second player always have.
+    """
+    if profile is None:
+        profile = ("classic", "light")[index % 2]
+    return Dinosaur(Dinosaur.X_POS - index * Dinosaur.X_SPACING, KEYMAPS[index], PROFILES[profile])
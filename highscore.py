@@ -1,4 +0,0 @@
-number = 1222
-
-with open('highscore.txt', 'w') as f:
-    f.write('%d' % number)
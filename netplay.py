@@ -0,0 +1,531 @@
+"""
+Versus over the network, with rollback.
+
+The two players of a versus game sit at different machines. Both run the
+whole game from the same seed, so the obstacles come out the same, and all
+they send each other is their JUMP/DUCK bitmask for every tick, over UDP.
+
+Waiting for the other side's input before every tick would add the round
+trip to every key press. Instead each side applies its own input at once
+and guesses the other's: whatever they were pressing last. A snapshot of
+the game (`Game.save()`) is kept for every tick that was played on a
+guess. When the real input arrives and differs from the guess, the game
+goes back to the snapshot of that tick and plays the ticks since then
+again with the right input, which on screen looks like the other dino
+snapping to where it really is. Nobody runs more than MAX_ROLLBACK ticks
+ahead of what they have heard from the other side; past that the game
+waits for them.
+
+Every packet carries all of the sender's inputs the other side has not
+acknowledged yet, so a lost packet is made up for by the next one and
+nothing is ever sent again on its own.
+
+    python netplay.py --host 5555              # wait for a player on port 5555
+    python netplay.py --join 192.168.1.20:5555  # play against them
+    python netplay.py --test --loss 0.1 --delay 0.05 --jitter 0.02
+                                               # two bots over localhost, with packets dropped and held back
+
+The test plays bot games between two sessions in one process, over real
+UDP sockets on 127.0.0.1 with loss and delay added on the sending side,
+and checks that both ended on the same game. It runs on a simulated clock,
+as fast as it can. It and the windowed game report how often the game
+rolled back, how many ticks were played again and what that cost.
+"""
+import argparse
+import heapq
+import os
+import random
+import socket
+import struct
+import time
+
+import pygame
+
+from controls import CONTROLS
+from replay import Replay, checksum, last_path, pack, play
+from scenes import GameOver, MENU_COLOR, MENU_FONT_COLOR, Menu, Playing, Scene
+from settings import SCREEN_HEIGHT, SCREEN_WIDTH, TICK_RATE
+from simulation import Game
+from text import TEXT
+from timestep import FixedTimestep
+
+MAGIC = b"DNET"
+PACKET = struct.Struct(">4sB")  # magic, kind
+HELLO = struct.Struct(">Q")  # seed
+INPUTS = struct.Struct(">IIbB")  # first frame, frames acknowledged, advantage, count; then count input bytes
+JOIN, WELCOME, INPUT, BYE = range(4)
+
+PORT = 5555
+MAX_ROLLBACK = 8  # ticks a player may run ahead of the other side's last input
+MAX_INPUTS = 64  # inputs per packet; more than MAX_ROLLBACK means a packet always catches up
+SYNC_INTERVAL = 10  # ticks between two waits to let a player who is behind catch up
+JOIN_INTERVAL = 0.1  # seconds between join requests
+LINGER = 1.0  # seconds a finished game keeps answering, so the other side finishes too
+
+
+class Peer:
+    """A non-blocking UDP socket talking to one address."""
+
+    def __init__(self, port=0, host="0.0.0.0", address=None):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.socket.bind((host, port))
+        self.address = address  # the other side, once known
+
+    def send(self, data):
+        if self.address is not None:
+            self.socket.sendto(data, self.address)
+
+    def receive(self):
+        """The (data, address) of every datagram waiting, from the other side or, before it is known, anyone."""
+        while True:
+            try:
+                data, address = self.socket.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                continue  # an ICMP port unreachable for an earlier send, on Windows
+            if self.address is None or address == self.address:
+                yield data, address
+
+    def port(self):
+        return self.socket.getsockname()[1]
+
+    def close(self):
+        self.socket.close()
+
+
+class LossyLink:
+    """A Peer that drops a share of what it sends and holds the rest back for a while.
+
+    delay and jitter are in seconds; each packet is held for delay plus up to
+    jitter, so packets can arrive out of order. clock gives the time, so a
+    test can run on a simulated one.
+    """
+
+    def __init__(self, peer, loss=0.0, delay=0.0, jitter=0.0, seed=None, clock=time.monotonic):
+        self.peer = peer
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.queue = []  # (due, number, data)
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def address(self):
+        return self.peer.address
+
+    @address.setter
+    def address(self, address):
+        self.peer.address = address
+
+    def send(self, data):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        due = self.clock() + self.delay + self.rng.random() * self.jitter
+        heapq.heappush(self.queue, (due, self.sent, data))
+
+    def flush(self):
+        now = self.clock()
+        while self.queue and self.queue[0][0] <= now:
+            self.peer.send(heapq.heappop(self.queue)[2])
+
+    def receive(self):
+        self.flush()
+        return self.peer.receive()
+
+    def port(self):
+        return self.peer.port()
+
+    def close(self):
+        self.peer.close()
+
+
+def packet(kind, body=b""):
+    return PACKET.pack(MAGIC, kind) + body
+
+
+def parse(data):
+    """(kind, body) of a packet, or (None, None) for anything that is not one."""
+    if len(data) < PACKET.size:
+        return None, None
+    magic, kind = PACKET.unpack_from(data)
+    if magic != MAGIC:
+        return None, None
+    return kind, data[PACKET.size:]
+
+
+class Session:
+    """Runs game for player local, with the other player's input coming over link.
+
+    Call advance() with the local input once per tick, unless stalled() or
+    waiting(), and receive() once per frame. Frames count the ticks played,
+    including the one a player crashed on.
+    """
+
+    def __init__(self, game, local, link, max_rollback=MAX_ROLLBACK):
+        self.game = game
+        self.local = local
+        self.remote = 1 - local
+        self.link = link
+        self.max_rollback = max_rollback
+        self.frame = 0  # the next frame to play
+        self.local_inputs = []
+        self.remote_inputs = []  # confirmed, in order
+        self.used = []  # the remote input each frame was played with, guessed or not
+        self.snapshots = {}  # frame -> game.save() from before it, for frames played on a guess
+        self.acked = 0  # local inputs the other side has
+        self.remote_frame = 0  # how far the other side had got, as of their last packet
+        self.remote_advantage = 0
+        self.last_wait = 0
+        self.closed = False  # the other side left
+        # Counters
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.resim_time = 0.0
+        self.max_resim = 0.0
+        self.max_depth = 0
+        self.stalls = 0
+        self.waits = 0
+
+    def advantage(self):
+        """How many frames ahead of the other side this one is, as far as it can tell."""
+        return self.frame - self.remote_frame
+
+    def stalled(self):
+        """Whether the next frame would roll back further than max_rollback, so it has to wait."""
+        return self.frame - len(self.remote_inputs) >= self.max_rollback
+
+    def waiting(self):
+        """Whether to skip a tick to let the other side catch up.
+
+        Both sides measure their lead from the packets they get, which are
+        equally late either way, so half the difference of the two is how
+        far this side really is ahead.
+        """
+        if self.frame - self.last_wait < SYNC_INTERVAL:
+            return False
+        if (self.advantage() - self.remote_advantage) // 2 < 1:
+            return False
+        self.last_wait = self.frame
+        self.waits += 1
+        return True
+
+    def finished(self):
+        """Whether the game is over with every input up to the crash confirmed, so it can't roll back."""
+        game = self.game
+        return game.game_over and len(self.remote_inputs) > game.ticks
+
+    def advance(self, bits):
+        """Play the next frame with the local input bits. False, and nothing played, while stalled()."""
+        if self.stalled():
+            self.stalls += 1
+            self.send()
+            return False
+        self.local_inputs.append(bits)
+        self.simulate(self.frame)
+        self.frame += 1
+        self.send()
+        return True
+
+    def simulate(self, frame):
+        if frame < len(self.remote_inputs):
+            remote = self.remote_inputs[frame]
+        else:
+            # Guess that the other side still presses what they last did
+            remote = self.remote_inputs[-1] if self.remote_inputs else 0
+            self.snapshots[frame] = self.game.save()
+        if frame == len(self.used):
+            self.used.append(remote)
+        else:
+            self.used[frame] = remote
+        inputs = [0, 0]
+        inputs[self.local] = self.local_inputs[frame]
+        inputs[self.remote] = remote
+        self.game.step(inputs)
+
+    def send(self):
+        end = min(self.frame, self.acked + MAX_INPUTS)
+        advantage = max(-128, min(127, self.advantage()))
+        body = INPUTS.pack(self.acked, len(self.remote_inputs), advantage, end - self.acked)
+        self.link.send(packet(INPUT, body + bytes(self.local_inputs[self.acked:end])))
+
+    def receive(self):
+        """Take in everything the other side sent, rolling back if a guess was wrong."""
+        wrong = None
+        for data, address in self.link.receive():
+            kind, body = parse(data)
+            if kind == JOIN:
+                # They missed the welcome; the host sends it again
+                self.link.send(packet(WELCOME, HELLO.pack(self.game.seed)))
+            elif kind == BYE:
+                self.closed = True
+            elif kind == INPUT and len(body) >= INPUTS.size:
+                start, acked, advantage, count = INPUTS.unpack_from(body)
+                inputs = body[INPUTS.size:INPUTS.size + count]
+                self.acked = max(self.acked, min(acked, self.frame))
+                if start + len(inputs) > self.remote_frame:
+                    self.remote_frame = start + len(inputs)
+                    self.remote_advantage = advantage
+                # Anything past a gap comes again in a later packet
+                for frame in range(len(self.remote_inputs), start + len(inputs)):
+                    if frame < start:
+                        break
+                    bits = inputs[frame - start]
+                    self.remote_inputs.append(bits)
+                    if frame < self.frame and self.used[frame] != bits and wrong is None:
+                        wrong = frame
+        if wrong is not None:
+            self.rollback(wrong)
+        # Confirmed frames are never played again
+        for frame in [frame for frame in self.snapshots if frame < len(self.remote_inputs)]:
+            del self.snapshots[frame]
+
+    def rollback(self, frame):
+        """Go back to before frame and play every frame since with the inputs known now."""
+        start = time.perf_counter()
+        game = self.game
+        game.load(self.snapshots[frame])
+        observer, game.observer = game.observer, None  # no sounds for ticks already heard
+        try:
+            for again in range(frame, self.frame):
+                self.simulate(again)
+        finally:
+            game.observer = observer
+        elapsed = time.perf_counter() - start
+        self.rollbacks += 1
+        self.resimulated += self.frame - frame
+        self.resim_time += elapsed
+        self.max_resim = max(self.max_resim, elapsed)
+        self.max_depth = max(self.max_depth, self.frame - frame)
+
+    def close(self, repeats=3):
+        for _ in range(repeats):
+            self.link.send(packet(BYE))
+
+    def replay(self):
+        """The finished game as a replay.Replay, from the confirmed inputs of both sides."""
+        game = self.game
+        frames = game.ticks + 1 if game.game_over else game.ticks
+        runs = []
+        for frame in range(frames):
+            inputs = [0, 0]
+            inputs[self.local] = self.local_inputs[frame]
+            inputs[self.remote] = self.remote_inputs[frame]
+            packed = pack(inputs)
+            if runs and runs[-1][0] == packed:
+                runs[-1][1] += 1
+            else:
+                runs.append([packed, 1])
+        return Replay(game.mode, game.seed, len(game.players), runs, frames, checksum(game))
+
+    def report(self):
+        return {
+            "frames": self.frame,
+            "rollbacks": self.rollbacks,
+            "resimulated_frames": self.resimulated,
+            "avg_resim_ms": self.resim_time / self.rollbacks * 1000 if self.rollbacks else 0.0,
+            "max_resim_ms": self.max_resim * 1000,
+            "max_rollback": self.max_depth,
+            "stalls": self.stalls,
+            "waits": self.waits,
+        }
+
+
+def format_report(report):
+    return ("%(frames)d frames, %(rollbacks)d rollbacks, %(resimulated_frames)d frames resimulated "
+            "(avg %(avg_resim_ms).3f ms, max %(max_resim_ms).3f ms per rollback, deepest %(max_rollback)d), "
+            "%(stalls)d stalls, %(waits)d waits" % report)
+
+
+class Connecting(Scene):
+    """Waits for the other player: the host for a join request, the joining side for the welcome."""
+
+    def __init__(self, manager, link, seed=None):
+        super().__init__(manager)
+        self.link = link
+        self.seed = seed  # the host picks the seed
+        self.next_join = 0.0
+
+    def wait(self):
+        return 20
+
+    def update(self, events):
+        for event in events:
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                self.link.close()
+                return None
+        if self.seed is None and time.monotonic() >= self.next_join:
+            self.link.send(packet(JOIN))
+            self.next_join = time.monotonic() + JOIN_INTERVAL
+        for data, address in self.link.receive():
+            kind, body = parse(data)
+            if kind == JOIN and self.seed is not None:
+                self.link.address = address
+                self.link.send(packet(WELCOME, HELLO.pack(self.seed)))
+                return NetPlaying(self.manager, Session(Game("versus", self.seed), 0, self.link))
+            if kind == WELCOME and self.seed is None and len(body) >= HELLO.size:
+                seed, = HELLO.unpack_from(body)
+                return NetPlaying(self.manager, Session(Game("versus", seed), 1, self.link))
+        return self
+
+    def draw(self):
+        if not self.redraw:
+            return
+        screen = self.manager.screen
+        screen.fill(MENU_COLOR)
+        if self.seed is not None:
+            message = "Waiting for a player on port %d" % self.link.port()
+        else:
+            message = "Connecting to %s:%d" % self.link.address
+        TEXT.draw(screen, message, MENU_FONT_COLOR, 30, center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+
+
+class NetPlaying(Playing):
+    """Playing, with the local player on the first seat's controls and the other one over the network."""
+
+    def __init__(self, manager, session):
+        Scene.__init__(self, manager)
+        self.mode = "versus"
+        self.session = session
+        self.game = session.game
+        self.timestep = FixedTimestep(manager.tick_rate)
+        self.alpha = 0.0
+        self.until = None
+
+    def update(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.session.close()
+                return None
+        session = self.session
+        session.receive()
+        local = [self.game.players[session.local]]
+        for _ in range(self.timestep.advance()):
+            if session.waiting():
+                continue
+            # Input is left with the controls while stalled, for the tick that does get played
+            session.advance(0 if session.stalled() else CONTROLS.sample(local, time.perf_counter())[0])
+        self.alpha = self.timestep.alpha
+
+        if session.finished():
+            if self.until is None:
+                # Keep answering for a moment, so the other side hears the last inputs too
+                self.until = time.monotonic() + LINGER
+                session.replay().save(last_path("net"))
+                print(format_report(session.report()))
+            elif time.monotonic() >= self.until or session.closed:
+                return GameOver(self.manager, self)
+            session.send()
+        elif session.closed:
+            print("The other player left.")
+            return Menu(self.manager)
+        return self
+
+
+def bot(policy, noise, rng):
+    """A test player: policy, with a random input instead on a share noise of the ticks."""
+    def choose(game, index):
+        if rng.random() < noise:
+            return rng.choice((0, 0, 1, 2))
+        return policy(game)[index]
+    return choose
+
+
+def test(games, loss, delay, jitter, seconds, seed, policy):
+    """Play bot games between two sessions over localhost. Returns whether both sides always agreed."""
+    import policies
+    import resources
+    resources.load(headless=True)
+    ticks = [0]
+    clock = lambda: ticks[0] / TICK_RATE
+    ok = True
+    everyone = []
+    for number in range(games):
+        host, guest = Peer(host="127.0.0.1"), Peer(host="127.0.0.1")
+        host.address, guest.address = guest.socket.getsockname(), host.socket.getsockname()
+        links = [LossyLink(peer, loss, delay, jitter, seed + number * 2 + index, clock)
+                 for index, peer in enumerate((host, guest))]
+        sessions = [Session(Game("versus", seed + number), index, link) for index, link in enumerate(links)]
+        rng = random.Random(seed + number)
+        bots = [bot(policies.load(policy), 0.02, rng) for _ in sessions]
+        limit = ticks[0] + int(seconds * TICK_RATE)
+        while not all(session.finished() for session in sessions) and ticks[0] < limit:
+            ticks[0] += 1
+            for session, choose in zip(sessions, bots):
+                session.receive()
+                if session.finished() or session.waiting():
+                    session.send()
+                    continue
+                session.advance(0 if session.stalled() else choose(session.game, session.local))
+        finished = all(session.finished() for session in sessions)
+        same = False
+        if finished:
+            # Only a finished game has every input confirmed on both sides
+            replays = [session.replay() for session in sessions]
+            same = replays[0].to_bytes() == replays[1].to_bytes()
+            same = same and checksum(play(replays[0])) == replays[0].checksum
+        ok = ok and same
+        print("game %d: %s, %d ticks, score %d, player %s crashed; %d of %d packets dropped: %s"
+              % (number, "finished" if finished else "NOT FINISHED", sessions[0].game.ticks, sessions[0].game.points,
+                 "/".join(str(index + 1) for index in sessions[0].game.crashed),
+                 sum(link.dropped for link in links), sum(link.sent for link in links),
+                 "same game on both sides" if same else "MISMATCH"))
+        for index, session in enumerate(sessions):
+            print("  player %d: %s" % (index + 1, format_report(session.report())))
+        everyone += sessions
+        for link in links:
+            link.close()
+    rollbacks = sum(session.rollbacks for session in everyone)
+    print("all: %s" % format_report({
+        "frames": sum(session.frame for session in everyone),
+        "rollbacks": rollbacks,
+        "resimulated_frames": sum(session.resimulated for session in everyone),
+        "avg_resim_ms": sum(session.resim_time for session in everyone) / max(1, rollbacks) * 1000,
+        "max_resim_ms": max(session.max_resim for session in everyone) * 1000,
+        "max_rollback": max(session.max_depth for session in everyone),
+        "stalls": sum(session.stalls for session in everyone),
+        "waits": sum(session.waits for session in everyone),
+    }))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play versus over the network, or test the netcode over localhost.")
+    side = parser.add_mutually_exclusive_group(required=True)
+    side.add_argument("--host", type=int, nargs="?", const=PORT, metavar="PORT", help="wait for a player on PORT")
+    side.add_argument("--join", metavar="HOST:PORT", help="play against the host at HOST:PORT")
+    side.add_argument("--test", action="store_true", help="play bot games between two sessions over localhost")
+    parser.add_argument("--loss", type=float, default=0.0, help="share of packets to drop")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to hold back each packet")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds more")
+    parser.add_argument("--games", type=int, default=5, help="games to play with --test")
+    parser.add_argument("--seconds", type=float, default=120, help="longest a --test game may take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", default="reflex", help="bot policy for --test")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.test:
+        raise SystemExit(0 if test(args.games, args.loss, args.delay, args.jitter, args.seconds, args.seed,
+                                   args.policy) else 1)
+
+    import main
+    from scenes import SceneManager
+    main.init()
+    if args.host is not None:
+        link = Peer(args.host)
+        seed = random.getrandbits(63)
+    else:
+        address, _, port = args.join.rpartition(":")
+        link = Peer(address=(socket.gethostbyname(address), int(port)))
+        seed = None
+    if args.loss or args.delay or args.jitter:
+        link = LossyLink(link, args.loss, args.delay, args.jitter)
+    manager = SceneManager()
+    manager.run(Connecting(manager, link, seed))
@@ -1,74 +1,207 @@
 import random
 
-from settings import SCREEN_WIDTH, GAME_SPEED
+import pygame
+
+import resources
+from settings import SCREEN_WIDTH, GAME_SPEED, TICK_RATE
+
+# Pixels scrolled between two spawns
+MIN_GAP = 600
+MAX_GAP = 1400
 
 
 class Obstacle:
-    def __init__(self, image, type):
+    __slots__ = ("image", "type", "rect", "prev_x")
+
+    def __init__(self, image, rng=random):
         self.image = image
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(rng)
+
+    def reset(self, rng=random, type=0, y=0):
+        """Put the obstacle back at the right edge of the screen, as if new."""
         self.type = type
-        self.rect = self.image[self.type].get_rect()
+        self.rect.size = self.image[type].get_size()
         self.rect.x = SCREEN_WIDTH
+        self.rect.y = y
+        self.prev_x = SCREEN_WIDTH
 
-    def update(self, obstacles):
+    def update(self):
+        """Scroll one tick. Returns False once the obstacle has left the screen."""
+        self.prev_x = self.rect.x
         self.rect.x -= GAME_SPEED
-        if self.rect.x < -self.rect.width:
-            obstacles.pop()
+        return self.rect.x >= -self.rect.width
+
+    def save(self):
+        """This obstacle's moving parts, for load()."""
+        return (self.type, tuple(self.rect), self.prev_x)
 
-    def draw(self, SCREEN):
-        SCREEN.blit(self.image[self.type], self.rect)
+    def load(self, state):
+        self.type, rect, self.prev_x = state
+        self.rect.update(rect)
+
+    def position(self, alpha):
+        """Top left corner alpha of the way from the previous tick to this one."""
+        return (self.prev_x + (self.rect.x - self.prev_x) * alpha, self.rect.y)
+
+    def sprite(self):
+        """The frame currently shown."""
+        return self.image[self.type]
+
+    def draw(self, SCREEN, alpha=1.0):
+        SCREEN.blit(resources.SKIN[self.sprite()], self.position(alpha))
 
 
 class SmallCactus(Obstacle):
-    def __init__(self, image):
-        self.type = random.randint(0, 2)
-        super().__init__(image, self.type)
-        self.rect.y = 325
+    __slots__ = ()
+
+    def reset(self, rng=random):
+        super().reset(rng, rng.randint(0, 2), 325)
 
 
 class LargeCactus(Obstacle):
-    def __init__(self, image):
-        self.type = random.randint(0, 2)
-        super().__init__(image, self.type)
-        self.rect.y = 300
+    __slots__ = ()
+
+    def reset(self, rng=random):
+        super().reset(rng, rng.randint(0, 2), 300)
 
 
 class Bird(Obstacle):
+    __slots__ = ("index",)
     BIRD_HEIGHTS = [250, 290, 320]
 
-    def __init__(self, image):
-        self.type = 0
-        super().__init__(image, self.type)
-        self.rect.y = random.choice(self.BIRD_HEIGHTS)
+    def reset(self, rng=random):
+        super().reset(rng, 0, rng.choice(self.BIRD_HEIGHTS))
         self.index = 0
 
-    def draw(self, SCREEN):
+    def update(self):
+        # Flap once per tick rather than once per drawn frame
+        self.index += 1
         if self.index >= 9:
             self.index = 0
-        SCREEN.blit(self.image[self.index // 5], self.rect)
-        self.index += 1
+        return super().update()
+
+    def sprite(self):
+        return self.image[self.index // 5]
+
+    def save(self):
+        return super().save() + (self.index,)
+
+    def load(self, state):
+        super().load(state[:-1])
+        self.index = state[-1]
+
 
 class Powerup(Obstacle):
+    __slots__ = ()
     BIRD_HEIGHTS = [250, 290, 320]
 
-    def __init__(self, image):
-        self.type = 0
-        super().__init__(image, self.type)
-        self.rect.y = random.choice(self.BIRD_HEIGHTS)
-        self.index = 0
+    def reset(self, rng=random):
+        super().reset(rng, 0, rng.choice(self.BIRD_HEIGHTS))
 
-    def draw(self, SCREEN):
-        SCREEN.blit(self.image[0], self.rect)
 
 class Speedup(Obstacle):
+    __slots__ = ()
     BIRD_HEIGHTS = [250, 290, 320]
 
-    def __init__(self, image):
-        self.type = 0
-        super().__init__(image, self.type)
-        self.rect.y = random.choice(self.BIRD_HEIGHTS)
-        self.index = 0
-
-    def draw(self, SCREEN):
-        SCREEN.blit(self.image[0], self.rect)
-
+    def reset(self, rng=random):
+        super().reset(rng, 0, rng.choice(self.BIRD_HEIGHTS))
+
+
+class ObstacleManager:
+    """Spawns, scrolls and recycles the obstacles of one game.
+
+    A new obstacle is spawned every min_gap to max_gap pixels of scrolling,
+    so several can be on screen at once, and its kind is picked by weight.
+    Obstacles that leave the screen or are collected go back to a pool per
+    kind and are reset on their next spawn instead of being reallocated.
+
+    active is the list of obstacles in flight. It is only ever changed in
+    place, by update() and sweep(), so code iterating over it can call
+    remove() freely.
+    """
+
+    def __init__(self, kinds, weights, rng=random, min_gap=MIN_GAP, max_gap=MAX_GAP):
+        self.kinds = kinds
+        self.weights = weights
+        self.rng = rng
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.active = []
+        self.pools = {kind: [] for kind, _ in kinds}
+        self.removed = []
+        self.next_spawn = 0
+        self.ticks = 0
+        self.spawned = 0
+        self.allocated = 0
+
+    def spawn(self):
+        (kind, image), = self.rng.choices(self.kinds, self.weights)
+        pool = self.pools[kind]
+        if pool:
+            obstacle = pool.pop()
+            obstacle.reset(self.rng)
+        else:
+            obstacle = kind(image, self.rng)
+            self.allocated += 1
+        self.active.append(obstacle)
+        self.spawned += 1
+
+    def update(self, distance):
+        """Spawn if distance has reached the next spawn point, then scroll everything."""
+        self.ticks += 1
+        if distance >= self.next_spawn:
+            self.spawn()
+            self.next_spawn = distance + self.rng.randint(self.min_gap, self.max_gap)
+
+        kept = 0
+        for obstacle in self.active:
+            if obstacle.update():
+                self.active[kept] = obstacle
+                kept += 1
+            else:
+                self.pools[type(obstacle)].append(obstacle)
+        del self.active[kept:]
+
+    def remove(self, obstacle):
+        """Take obstacle out of play at the next sweep()."""
+        self.removed.append(obstacle)
+
+    def sweep(self):
+        for obstacle in self.removed:
+            self.active.remove(obstacle)
+            self.pools[type(obstacle)].append(obstacle)
+        self.removed.clear()
+
+    def save(self):
+        """The obstacles in flight and the spawn schedule, for load(). The pools are not saved."""
+        return ([(type(obstacle), obstacle.save()) for obstacle in self.active],
+                self.next_spawn, self.ticks, self.spawned)
+
+    def load(self, state):
+        """Go back to a save(), reusing pooled obstacles for the ones in flight."""
+        obstacles, self.next_spawn, self.ticks, self.spawned = state
+        for obstacle in self.active:
+            self.pools[type(obstacle)].append(obstacle)
+        self.active.clear()
+        self.removed.clear()
+        images = dict(self.kinds)
+        for kind, saved in obstacles:
+            pool = self.pools[kind]
+            if pool:
+                obstacle = pool.pop()
+            else:
+                obstacle = kind(images[kind], self.rng)
+                self.allocated += 1
+            obstacle.load(saved)
+            self.active.append(obstacle)
+
+    def stats(self):
+        minutes = self.ticks / TICK_RATE / 60 or 1
+        return {
+            "spawned": self.spawned,
+            "allocated": self.allocated,
+            "in_flight": len(self.active),
+            "spawns_per_minute": self.spawned / minutes,
+            "allocations_per_minute": self.allocated / minutes,
+        }
@@ -0,0 +1,89 @@
+"""
+Scripted bot policies for headless runs.
+
+A policy is a callable that takes a `simulation.Game` and returns one
+JUMP/DUCK bitmask per player for the next tick. `POLICIES` maps the names
+used on the command line to factories, so policies can be named in a
+worker process without pickling them. Anything else can be given as
+"module:attribute", which must name such a factory.
+"""
+import importlib
+
+from dinosaur import JUMP, DUCK
+from obstacles import Bird
+from simulation import idle
+
+HIGH_BIRD = min(Bird.BIRD_HEIGHTS)
+
+
+def next_obstacle(game, player):
+    """The nearest obstacle that has not passed the player yet, or None."""
+    ahead = [obstacle for obstacle in game.obstacles if obstacle.rect.right > player.dino_rect.left]
+    return min(ahead, key=lambda obstacle: obstacle.rect.x, default=None)
+
+
+def reflex(distance=100):
+    """Jump when anything is within distance pixels of the dino's nose."""
+    def policy(game):
+        actions = []
+        for player in game.players:
+            obstacle = next_obstacle(game, player)
+            near = obstacle is not None and obstacle.rect.left - player.dino_rect.right < distance
+            actions.append(JUMP if near else 0)
+        return actions
+    return policy
+
+
+def ducker(distance=100):
+    """Like reflex, but ducks under the highest birds instead of jumping them."""
+    def policy(game):
+        actions = []
+        for player in game.players:
+            obstacle = next_obstacle(game, player)
+            if obstacle is None or obstacle.rect.left - player.dino_rect.right >= distance:
+                actions.append(0)
+            elif isinstance(obstacle, Bird) and obstacle.rect.y <= HIGH_BIRD:
+                actions.append(DUCK)
+            else:
+                actions.append(JUMP)
+        return actions
+    return policy
+
+
+def planner():
+    """Jump on the last tick that still clears the next obstacle, using Dinosaur.clears().
+
+    Obstacles that no jump gets over are ducked under.
+    """
+    def policy(game):
+        actions = []
+        for player in game.players:
+            obstacle = next_obstacle(game, player)
+            if obstacle is None or player.dino_jump or player.clears(obstacle.rect, game.game_speed, None):
+                actions.append(0)
+            elif player.clears(obstacle.rect, game.game_speed, 0):
+                actions.append(0 if player.clears(obstacle.rect, game.game_speed, 1) else JUMP)
+            elif player.profile.survivable(player.ground_box(), obstacle.rect, game.game_speed, player.jump_vel):
+                actions.append(0)  # too early to jump
+            else:
+                actions.append(DUCK)
+        return actions
+    return policy
+
+
+POLICIES = {
+    "idle": lambda: idle,
+    "reflex": reflex,
+    "ducker": ducker,
+    "planner": planner,
+}
+
+
+def load(name):
+    """Build the policy registered as name, or imported from "module:attribute"."""
+    if name in POLICIES:
+        return POLICIES[name]()
+    module, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError("unknown policy %r" % name)
+    return getattr(importlib.import_module(module), attribute)()
@@ -0,0 +1,127 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+from text import TEXT
+
+OVERLAY_KEY = pygame.K_F3
+OVERLAY_REFRESH = 30  # frames between recomputing the overlay's percentiles
+TRACE_EVENTS = 100000  # most recent scopes kept for dump_trace()
+
+
+class NullScope:
+    """What scope() hands out while profiling is off: entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SCOPE = NullScope()
+
+
+class Scope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """Named scope timers for the phases of the game loop.
+
+    Wrap each phase in `with PROFILER.scope(name):`. While enabled, every
+    scope's duration goes into a rolling window of the last `window` samples
+    per name, for p50/p95/p99, and into a bounded list of trace events that
+    dump_trace() writes in the Chrome trace format (chrome://tracing or
+    Perfetto). While disabled, scope() returns one shared do-nothing context
+    manager, so leaving the scopes in the loop costs next to nothing.
+    """
+
+    def __init__(self, window=600, enabled=False):
+        self.window = window
+        self.enabled = enabled
+        self.overlay = False
+        self.samples = {}
+        self.scopes = {}
+        self.events = deque(maxlen=TRACE_EVENTS)
+        self.origin = time.perf_counter()
+        self.frames = 0
+        self.lines = []
+
+    def scope(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = Scope(self, name)
+        return scope
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+        self.events.append((name, start, end))
+
+    def toggle(self):
+        """Turn profiling and the overlay on or off together."""
+        self.overlay = not self.overlay
+        self.enabled = self.overlay
+        self.lines = []
+
+    def handle(self, event):
+        if event.type == pygame.KEYDOWN and event.key == OVERLAY_KEY:
+            self.toggle()
+
+    def percentiles(self, name):
+        """p50, p95 and p99 of the window for name, in milliseconds."""
+        ordered = sorted(self.samples[name])
+        last = len(ordered) - 1
+        return tuple(ordered[round(last * p)] * 1000 for p in (0.50, 0.95, 0.99))
+
+    def stats(self):
+        return {name: self.percentiles(name) for name in self.samples if self.samples[name]}
+
+    def report(self):
+        lines = ["%-10s %7s %7s %7s" % ("phase (ms)", "p50", "p95", "p99")]
+        for name, (p50, p95, p99) in self.stats().items():
+            lines.append("%-10s %7.2f %7.2f %7.2f" % (name, p50, p95, p99))
+        return "\n".join(lines)
+
+    def draw(self, screen, color, topleft=(20, 20), size=16):
+        """Draw the percentiles in the top left corner, if the overlay is on."""
+        if not self.overlay:
+            return
+        if self.frames % OVERLAY_REFRESH == 0 or not self.lines:
+            self.lines = self.report().split("\n")
+        self.frames += 1
+        x, y = topleft
+        for line in self.lines:
+            surface = TEXT.render(line, color, size)
+            screen.blit(surface, (x, y))
+            y += surface.get_height()
+
+    def dump_trace(self, path):
+        """Write the recorded scopes as a Chrome trace JSON file."""
+        events = [{"name": name, "ph": "X", "pid": 1, "tid": 1,
+                   "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+                  for name, start, end in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,60 @@
+import pygame
+
+
+class Renderer:
+    """Draws a frame by patching only what moved since the last one.
+
+    Pass the renderer wherever a draw() method expects SCREEN: every blit is
+    recorded, and at the start of the next frame those same areas are
+    restored from a cached background layer instead of refilling the whole
+    screen. present() hands pygame.display.update() only the areas that were
+    cleared or drawn. With dirty=False it fills and flips the whole screen
+    every frame, as the game used to, so the two can be compared.
+    """
+
+    def __init__(self, screen, dirty=True):
+        self.screen = screen
+        self.dirty = dirty
+        self.background = None
+        self.background_color = None
+        self.full_redraw = True
+        self.cleared = []
+        self.drawn = []
+        self.pixels = 0
+
+    def invalidate(self):
+        """Redraw and present everything next frame, e.g. after something else drew on the screen."""
+        self.full_redraw = True
+
+    def begin(self, color):
+        """Start a frame on a plain background of color."""
+        if color != self.background_color or self.background is None:
+            self.background_color = color
+            self.background = pygame.Surface(self.screen.get_size()).convert()
+            self.background.fill(color)
+            self.full_redraw = True
+
+        if self.full_redraw or not self.dirty:
+            self.screen.blit(self.background, (0, 0))
+            self.cleared.clear()
+        else:
+            for rect in self.drawn:
+                self.screen.blit(self.background, rect, rect)
+            self.cleared, self.drawn = self.drawn, self.cleared
+        self.drawn.clear()
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        rect = self.screen.blit(source, dest, area, special_flags)
+        self.drawn.append(rect)
+        return rect
+
+    def present(self):
+        if self.full_redraw or not self.dirty:
+            pygame.display.update()
+            self.pixels = self.screen.get_width() * self.screen.get_height()
+            self.full_redraw = False
+        else:
+            # Layers that cover the same area every frame clear and redraw the same rect
+            rects = self.drawn + [rect for rect in self.cleared if rect not in self.drawn]
+            pygame.display.update(rects)
+            self.pixels = sum(rect.width * rect.height for rect in rects)
@@ -0,0 +1,204 @@
+"""
+Recording and playing back games, tick for tick.
+
+A `simulation.Game` is fully determined by its mode, player count, seed and
+the JUMP/DUCK bitmask of every player on every tick. A replay file holds
+just those, with the inputs run-length encoded: each run is the number of
+ticks and the packed inputs held over them, both as varints. Holding a key
+for half a second is one run, so a ten minute game takes a few KB.
+
+The file also stores a checksum of the game's final state. Playing a replay
+back, in the window at normal speed (`main.py --replay FILE`) or headless as
+fast as possible (`python replay.py FILE`), rebuilds the game from scratch and
+compares checksums, so a change to the game logic that alters any replay
+shows up as a mismatch.
+"""
+import argparse
+import os
+import struct
+import time
+import zlib
+
+import resources
+from settings import TICK_RATE
+from simulation import Game
+
+MAGIC = b"DINO"
+VERSION = 1
+HEADER = struct.Struct(">4sBBQII")  # magic, version, players, seed, frames, checksum
+REPLAY_DIR = "replays"
+# Each player's JUMP/DUCK mask takes two bits of a packed frame
+BITS_PER_PLAYER = 2
+
+
+class ReplayError(Exception):
+    pass
+
+
+def pack(inputs):
+    frame = 0
+    for index, actions in enumerate(inputs):
+        frame |= actions << (index * BITS_PER_PLAYER)
+    return frame
+
+
+def unpack(frame, players):
+    mask = (1 << BITS_PER_PLAYER) - 1
+    return [(frame >> (index * BITS_PER_PLAYER)) & mask for index in range(players)]
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        if offset >= len(data):
+            raise ReplayError("replay ends in the middle of a run")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def checksum(game):
+    """A CRC of everything in game that the next tick depends on."""
+    state = [game.ticks, game.points, game.distance, game.game_over, game.crashed]
+    for player in game.players:
+        state.append((tuple(player.dino_rect), player.jump_vel, player.dino_duck, player.dino_run,
+                      player.dino_jump, player.step_index, player.arc_tick))
+    for obstacle in game.obstacles:
+        state.append((type(obstacle).__name__, tuple(obstacle.rect), obstacle.sprite().get_size()))
+    state.append(game.rng.getstate())
+    return zlib.crc32(repr(state).encode())
+
+
+class Recorder:
+    """Records the inputs game is stepped with from now on."""
+
+    def __init__(self, game):
+        game.recorder = self
+        self.mode = game.mode
+        self.seed = game.seed
+        self.players = len(game.players)
+        self.game = game
+        self.runs = []  # [frame, ticks] pairs
+        self.frames = 0
+
+    def record(self, inputs):
+        frame = pack(inputs)
+        if self.runs and self.runs[-1][0] == frame:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([frame, 1])
+        self.frames += 1
+
+    def replay(self):
+        return Replay(self.mode, self.seed, self.players, self.runs, self.frames, checksum(self.game))
+
+    def save(self, path):
+        self.replay().save(path)
+
+
+class Replay:
+    """A recorded game: how it started, its inputs and the checksum it ended on."""
+
+    def __init__(self, mode, seed, players, runs, frames, checksum):
+        self.mode = mode
+        self.seed = seed
+        self.players = players
+        self.runs = runs
+        self.frames = frames
+        self.checksum = checksum
+
+    def inputs(self):
+        """The inputs of every tick, in order."""
+        for frame, ticks in self.runs:
+            inputs = unpack(frame, self.players)
+            for _ in range(ticks):
+                yield inputs
+
+    def game(self):
+        return Game(self.mode, self.seed, self.players)
+
+    def to_bytes(self):
+        out = bytearray(HEADER.pack(MAGIC, VERSION, self.players, self.seed, self.frames, self.checksum))
+        mode = self.mode.encode()
+        out.append(len(mode))
+        out += mode
+        for frame, ticks in self.runs:
+            write_varint(out, ticks)
+            write_varint(out, frame)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size + 1:
+            raise ReplayError("not a replay file")
+        magic, version, players, seed, frames, check = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("not a replay file")
+        if version != VERSION:
+            raise ReplayError("replay version %d, expected %d" % (version, VERSION))
+        offset = HEADER.size
+        length = data[offset]
+        mode = data[offset + 1:offset + 1 + length].decode()
+        offset += 1 + length
+        runs = []
+        while offset < len(data):
+            ticks, offset = read_varint(data, offset)
+            frame, offset = read_varint(data, offset)
+            runs.append([frame, ticks])
+        return cls(mode, seed, players, runs, frames, check)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def last_path(mode):
+    """Where the most recent game of mode is saved."""
+    return os.path.join(REPLAY_DIR, "last-%s.dinorep" % mode)
+
+
+def play(replay):
+    """Play replay headless as fast as possible and return the finished game."""
+    if resources.ATLAS is None:
+        resources.load(headless=True)
+    game = replay.game()
+    for inputs in replay.inputs():
+        game.step(inputs)
+    return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play replays headless at full speed and check they still match.")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.paths:
+        replay = Replay.load(path)
+        start = time.perf_counter()
+        game = play(replay)
+        elapsed = time.perf_counter() - start
+        ok = checksum(game) == replay.checksum
+        failed += not ok
+        print("%s: %s, %d ticks (%.1f s of play) in %.3f s, score %d: %s"
+              % (path, replay.mode, replay.frames, replay.frames / TICK_RATE, elapsed, game.points,
+                 "ok" if ok else "MISMATCH"))
+    raise SystemExit(1 if failed else 0)
@@ -1,40 +1,233 @@
-import pygame
+import json
 import os
+import struct
+import zlib
+
+import pygame
+
+import settings
+from startup import STARTUP
+
+ATLAS_DIRS = ["assets/Dino", "assets/Cactus", "assets/Bird", "assets/Other"]
+ATLAS_EXTRA = ["assets/Powerup.PNG"]
+ATLAS_CACHE_DIR = ".cache"
+ATLAS_PADDING = 1
+
+
+def atlas_sources():
+    sources = []
+    for directory in ATLAS_DIRS:
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(".png"):
+                sources.append(os.path.join(directory, name))
+    sources.extend(ATLAS_EXTRA)
+    return sources
+
+
+def sprite_name(path):
+    """assets/Dino/DinoRun1.png -> Dino/DinoRun1"""
+    name = os.path.splitext(os.path.relpath(path, "assets"))[0]
+    return name.replace(os.sep, "/")
+
+
+def png_size(path):
+    """Read a PNG's width and height from its IHDR chunk without decoding it."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    return struct.unpack(">II", header[16:24])
+
+
+def inverted(surface):
+    """A copy of surface with its colours inverted and its alpha kept, like Chrome's night mode."""
+    result = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+    result.fill((255, 255, 255, 255))
+    result.blit(surface, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+    alpha = surface.copy()
+    alpha.fill((255, 255, 255, 0), special_flags=pygame.BLEND_RGBA_MAX)
+    result.blit(alpha, (0, 0), special_flags=pygame.BLEND_RGBA_MIN)
+    if pygame.display.get_surface() is not None:
+        result = result.convert_alpha()
+    return result
+
+
+def pack(sizes, width):
+    """Shelf-pack (name, (w, h)) pairs, tallest first, into rows of width."""
+    rects = {}
+    x = y = row_height = 0
+    for name, (w, h) in sorted(sizes, key=lambda item: (-item[1][1], item[0])):
+        if x + w > width:
+            x = 0
+            y += row_height + ATLAS_PADDING
+            row_height = 0
+        rects[name] = (x, y, w, h)
+        x += w + ATLAS_PADDING
+        row_height = max(row_height, h)
+    return rects, y + row_height
+
+
+class SpriteAtlas:
+    """All game sprites packed into one display-format surface.
+
+    The packed pixels and the name -> rect index are kept in ATLAS_CACHE_DIR,
+    so a launch with unchanged assets reads one raw blob instead of decoding
+    every PNG.
+    """
+
+    def __init__(self, cache_dir=ATLAS_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "atlas.json")
+        self.pixels_path = os.path.join(cache_dir, "atlas.rgba.z")
+        self.sources = atlas_sources()
+        self.from_cache = False
+
+        surface, self.rects = self.load_cached()
+        if surface is None:
+            surface, self.rects = self.build()
+            self.save(surface)
+        else:
+            self.from_cache = True
+        settings.init_display()  # convert_alpha() needs the display format
+        self.surface = surface.convert_alpha()
+        self.sprites = {name: self.surface.subsurface(rect) for name, rect in self.rects.items()}
+
+    def __getitem__(self, name):
+        return self.sprites[name]
+
+    def mask(self, name):
+        return pygame.mask.from_surface(self.sprites[name])
+
+    def inverted(self):
+        """Every sprite, colour inverted, cut from one inverted copy of the atlas."""
+        surface = inverted(self.surface)
+        return {name: surface.subsurface(rect) for name, rect in self.rects.items()}
+
+    def signature(self):
+        return [[path, os.stat(path).st_mtime_ns, os.stat(path).st_size] for path in self.sources]
+
+    def build(self):
+        images = {sprite_name(path): pygame.image.load(path) for path in self.sources}
+        width = max(1024, max(image.get_width() for image in images.values()))
+        rects, height = pack([(name, image.get_size()) for name, image in images.items()], width)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        for name, (x, y, _, _) in rects.items():
+            surface.blit(images[name], (x, y))
+        return surface, rects
+
+    def load_cached(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index["signature"] != self.signature():
+                return None, None
+            with open(self.pixels_path, "rb") as f:
+                pixels = zlib.decompress(f.read())
+            surface = pygame.image.fromstring(pixels, tuple(index["size"]), "RGBA")
+        except (OSError, ValueError, KeyError, zlib.error):
+            return None, None
+        return surface, {name: tuple(rect) for name, rect in index["rects"].items()}
+
+    def save(self, surface):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.pixels_path, "wb") as f:
+                f.write(zlib.compress(pygame.image.tostring(surface, "RGBA"), 1))
+            with open(self.index_path, "w") as f:
+                json.dump({"size": surface.get_size(), "signature": self.signature(),
+                           "rects": self.rects}, f)
+        except OSError:
+            pass  # a read-only checkout just rebuilds the atlas every launch
+
+
+class HeadlessAtlas:
+    """Blank, correctly sized stand-ins for the sprites, for runs without a display.
+
+    The game logic only needs the sizes and the collision masks, so no
+    window is needed and a PNG is only decoded to build its mask.
+    """
+
+    def __init__(self):
+        self.paths = {sprite_name(path): path for path in atlas_sources()}
+        self.sprites = {name: pygame.Surface(png_size(path)) for name, path in self.paths.items()}
+
+    def __getitem__(self, name):
+        return self.sprites[name]
+
+    def mask(self, name):
+        return pygame.mask.from_surface(pygame.image.load(self.paths[name]))
+
+    def inverted(self):
+        return {name: inverted(sprite) for name, sprite in self.sprites.items()}
+
+
+SPRITES = {
+    "RUNNING": ["Dino/DinoRun1", "Dino/DinoRun2"],
+    "JUMPING": "Dino/DinoJump",
+    "DUCKING": ["Dino/DinoDuck1", "Dino/DinoDuck2"],
+    "SMALL_CACTUS": ["Cactus/SmallCactus1", "Cactus/SmallCactus2", "Cactus/SmallCactus3"],
+    "LARGE_CACTUS": ["Cactus/LargeCactus1", "Cactus/LargeCactus2", "Cactus/LargeCactus3"],
+    "BIRD": ["Bird/Bird1", "Bird/Bird2"],
+    "CLOUD": "Other/Cloud",
+    "BG": "Other/Track",
+    "POWERUP": ["Powerup"],
+    "SPEEDUP": ["Other/Speedup"],
+}
+
+# Sprites whose opaque pixels are tested for collisions
+MASKED = ["RUNNING", "JUMPING", "DUCKING", "SMALL_CACTUS", "LARGE_CACTUS", "BIRD", "POWERUP", "SPEEDUP"]
+
+# Filled in by load(); until then the names in SPRITES are resolved lazily.
+ATLAS = None
+# Sprite frame surface -> its pygame.mask.Mask, for the frames in MASKED
+MASKS = {}
+# Theme name -> {surface: the surface to draw in its place}. The game logic
+# and the masks only ever see the light sprites; draw() methods look what
+# they blit up in SKIN, which use() points at one of these.
+SKINS = {"light": {}, "dark": {}}
+SKIN = SKINS["light"]
+
+
+def load(headless=False):
+    """Build the atlas and publish the sprite names above. Safe to call more than once.
+
+    With headless=True no window is opened and the sprites are blank
+    surfaces of the right size, which is all the simulation needs.
+    """
+    global ATLAS
+    if ATLAS is None:
+        if headless:
+            ATLAS = HeadlessAtlas()
+        else:
+            settings.init_display()
+            with STARTUP.phase("images"):
+                ATLAS = SpriteAtlas()
+        for name, entry in SPRITES.items():
+            if isinstance(entry, list):
+                globals()[name] = [ATLAS[sprite] for sprite in entry]
+            else:
+                globals()[name] = ATLAS[entry]
+            if name in MASKED:
+                for sprite in (entry if isinstance(entry, list) else [entry]):
+                    MASKS[ATLAS[sprite]] = ATLAS.mask(sprite)
+        dark = ATLAS.inverted()
+        for name, sprite in ATLAS.sprites.items():
+            register(sprite, dark=dark[name])
+    return ATLAS
+
+
+def register(surface, **variants):
+    """Add surface to every skin, drawn as variants[theme] where given and as itself elsewhere."""
+    for theme, skin in SKINS.items():
+        skin[surface] = variants.get(theme, surface)
+
+
+def use(theme):
+    """Draw everything in theme from now on."""
+    global SKIN
+    SKIN = SKINS[theme]
+
 
-RUNNING = [
-    pygame.image.load(os.path.join("assets/Dino", "DinoRun1.png")),
-    pygame.image.load(os.path.join("assets/Dino", "DinoRun2.png")),
-]
-JUMPING = pygame.image.load(os.path.join("assets/Dino", "DinoJump.png"))
-DUCKING = [
-    pygame.image.load(os.path.join("assets/Dino", "DinoDuck1.png")),
-    pygame.image.load(os.path.join("assets/Dino", "DinoDuck2.png")),
-]
-
-SMALL_CACTUS = [
-    pygame.image.load(os.path.join("assets/Cactus", "SmallCactus1.png")),
-    pygame.image.load(os.path.join("assets/Cactus", "SmallCactus2.png")),
-    pygame.image.load(os.path.join("assets/Cactus", "SmallCactus3.png")),
-]
-LARGE_CACTUS = [
-    pygame.image.load(os.path.join("assets/Cactus", "LargeCactus1.png")),
-    pygame.image.load(os.path.join("assets/Cactus", "LargeCactus2.png")),
-    pygame.image.load(os.path.join("assets/Cactus", "LargeCactus3.png")),
-]
-
-BIRD = [
-    pygame.image.load(os.path.join("assets/Bird", "Bird1.png")),
-    pygame.image.load(os.path.join("assets/Bird", "Bird2.png")),
-]
-
-CLOUD = pygame.image.load(os.path.join("assets/Other", "Cloud.png"))
-
-BG = pygame.image.load(os.path.join("assets/Other", "Track.png"))
-
-POWERUP = [
-    pygame.image.load(os.path.join("assets", "Powerup.PNG")),
-]
-
-SPEEDUP = [
-    pygame.image.load(os.path.join("assets/Other", "Speedup.png")),
-]
+def __getattr__(name):
+    if name in SPRITES:
+        load()
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,484 @@
+"""
+The game's screens as a flat state machine.
+
+Every screen is a Scene: the title menu, the mode selection, a game being
+played, the pause screen and the game over screen. SceneManager.run() is the
+only loop. Each frame it hands the current scene the events, and update()
+returns the scene to show next: itself, another one, or None to quit.
+Starting a game, pausing, dying and going back to the menu swap one scene
+for another instead of calling into a new loop, so the call stack stays the
+same depth however many games are played and whatever a finished game held
+on to is freed.
+
+    python scenes.py --soak 500     # play 500 games headless and check memory stays flat
+    python scenes.py --idle 5       # CPU used while the menu, pause and game over screens sit idle
+
+Only Playing draws every frame. The other scenes draw when something
+changed, and between frames the manager sleeps in pygame.event.wait(), so
+a paused game or an open menu uses next to no CPU.
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+import background
+import resources
+import settings
+from audio import AUDIO
+from controls import CONTROLS
+from profiler import PROFILER
+from renderer import Renderer
+from replay import Recorder, last_path
+from scores import LEADERBOARD
+from settings import SCREEN, SCREEN_HEIGHT, SCREEN_WIDTH, RENDER_FPS, TICK_RATE
+from simulation import Game
+from spectate import BROADCAST
+from text import TEXT
+from theme import THEME
+from timestep import FixedTimestep
+
+MENU_COLOR = (0, 0, 0)
+GAME_OVER_COLOR = (128, 128, 128)
+MENU_FONT_COLOR = (255, 255, 255)
+FREEZE_TIME = 2.0  # seconds the last frame of a game stays up before the game over screen
+# Longest an idle scene sleeps in pygame.event.wait() before it is updated anyway
+IDLE_WAIT = 500  # milliseconds
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+
+
+class Scene:
+    """One screen. Subclasses override what they need.
+
+    By default a scene is idle: it only draws when `redraw` is set, and the
+    manager sleeps in pygame.event.wait() between its frames instead of
+    drawing them at the full frame rate.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.redraw = True
+
+    def enter(self):
+        """Called every time the scene becomes the current one."""
+        self.redraw = True
+
+    def wait(self):
+        """Milliseconds the manager may block for events before the next frame, or None not to block."""
+        return IDLE_WAIT
+
+    def expose(self):
+        """The window needs repainting, e.g. after being uncovered."""
+        self.redraw = True
+
+    def update(self, events):
+        """Handle this frame's events and return the scene to show next, or None to quit."""
+        return self
+
+    def draw(self):
+        pass
+
+    def present(self):
+        if self.redraw:
+            pygame.display.update()
+            self.redraw = False
+
+
+class Choice(Scene):
+    """A title and a few options, picked with up/down and return."""
+
+    OPTIONS = ()
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.selected = 0
+
+    def choose(self, index):
+        """The scene that picking OPTIONS[index] leads to."""
+        raise NotImplementedError
+
+    def update(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_DOWN:
+                    self.selected = (self.selected + 1) % len(self.OPTIONS)
+                    self.redraw = True
+                elif event.key == pygame.K_UP:
+                    self.selected = (self.selected - 1) % len(self.OPTIONS)
+                    self.redraw = True
+                elif event.key == pygame.K_RETURN:
+                    return self.choose(self.selected)
+        return self
+
+    def draw(self):
+        if not self.redraw:
+            return
+        screen = self.manager.screen
+        screen.fill(MENU_COLOR)
+        TEXT.draw(screen, "Dinosaur Game", MENU_FONT_COLOR, 30, center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4))
+        for index, option in enumerate(self.OPTIONS):
+            label = option + " <-" if index == self.selected else option
+            TEXT.draw(screen, label, MENU_FONT_COLOR, 30,
+                      center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // (2 - index * 0.5)))
+
+
+class Menu(Choice):
+    OPTIONS = ("Start Game", "Quit")
+
+    def choose(self, index):
+        return ModeSelect(self.manager) if index == 0 else None
+
+
+class ModeSelect(Choice):
+    OPTIONS = ("Singleplayer", "Multiplayer")
+
+    def choose(self, index):
+        if index == 0:
+            return Playing(self.manager, "single")
+        return MultiplayerSelect(self.manager)
+
+
+class MultiplayerSelect(ModeSelect):
+    OPTIONS = ("Coop Modus", "Wettkampf Modus")
+
+    def choose(self, index):
+        return Playing(self.manager, ("coop", "versus")[index])
+
+
+class Playing(Scene):
+    """A game of mode in progress, stepped in fixed ticks and drawn interpolated between them."""
+
+    def __init__(self, manager, mode):
+        super().__init__(manager)
+        self.mode = mode
+        self.game = Game(mode, players=None if mode == "single" else settings.LOCAL_PLAYERS)
+        Recorder(self.game)
+        if AUDIO.enabled:
+            self.game.observer = AUDIO
+        self.timestep = FixedTimestep(manager.tick_rate)
+        self.alpha = 0.0
+
+    def enter(self):
+        # Whatever was on screen before is not in the renderer's dirty rects
+        CONTROLS.reset()
+        self.timestep.reset()
+        self.manager.renderer.invalidate()
+
+    def wait(self):
+        return None
+
+    def expose(self):
+        self.manager.renderer.invalidate()
+
+    def update(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                return Paused(self.manager, self)
+
+        # Advance the game by however many fixed ticks are due, so a slow
+        # frame does not slow the game down. Input is sampled every tick.
+        game = self.game
+        with PROFILER.scope("update"):
+            for _ in range(self.timestep.advance()):
+                now = time.perf_counter()
+                actions = CONTROLS.sample(game.players, now)
+                AUDIO.input_time = CONTROLS.jump_time or now
+                alive = game.step(actions)
+                if BROADCAST.enabled:
+                    BROADCAST.publish(game)
+                if not alive:
+                    break
+        if BROADCAST.enabled:
+            BROADCAST.flush()
+        self.alpha = self.timestep.alpha
+        with PROFILER.scope("highscore"):
+            LEADERBOARD.submit(self.mode, game.points)
+
+        if game.game_over:
+            game.recorder.save(last_path(self.mode))
+            LEADERBOARD.record(settings.PLAYER_NAME, self.mode, game.points, game.ticks / TICK_RATE, game.seed)
+            return GameOver(self.manager, self)
+        return self
+
+    def draw(self):
+        game = self.game
+        renderer = self.manager.renderer
+        alpha = self.alpha
+        distance = game.scrolled(alpha)
+        with PROFILER.scope("clear"):
+            THEME.begin(renderer)
+
+        # Draw clouds, players, scores, obstacles and the track
+        for target in THEME.passes(renderer):
+            background.BACKGROUND.draw_back(target, distance)
+            for player in reversed(game.players):
+                player.draw(target, alpha)
+            if self.mode == "versus":
+                # The first crash ends a versus game, so both players always have the same points
+                TEXT.draw_number(target, game.points, THEME.font, 20,
+                                 (SCREEN_WIDTH // 2 - 600, SCREEN_HEIGHT // 2 - 350), prefix="Score: ")
+            for obstacle in game.obstacles:
+                obstacle.draw(target, alpha)
+            background.BACKGROUND.draw_front(target, distance)
+        PROFILER.draw(renderer, THEME.font)
+
+    def present(self):
+        self.manager.renderer.present()
+
+
+class Paused(Scene):
+    """The frozen game with a message over it, until 'u' goes back to it."""
+
+    def __init__(self, manager, playing):
+        super().__init__(manager)
+        self.playing = playing
+
+    def update(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_u:
+                return self.playing
+        return self
+
+    def draw(self):
+        if not self.redraw:
+            return
+        self.playing.draw()
+        TEXT.draw(self.manager.screen, "Game Paused, Press 'u' to Unpause", THEME.font, 30,
+                  center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3))
+
+
+class GameOver(Scene):
+    """The last frame of the game for manager.freeze seconds, then the score until a key is pressed."""
+
+    def __init__(self, manager, playing):
+        super().__init__(manager)
+        self.mode = playing.mode
+        self.points = playing.game.points
+        self.until = time.monotonic() + manager.freeze
+
+    def frozen(self):
+        return time.monotonic() < self.until
+
+    def enter(self):
+        # The last frame of the game is already on screen
+        self.redraw = False
+        self.thawed = False
+
+    def wait(self):
+        if self.thawed:
+            return IDLE_WAIT
+        # Wake up when the freeze ends, to draw the score
+        return max(1, min(IDLE_WAIT, int((self.until - time.monotonic()) * 1000) + 1))
+
+    def update(self, events):
+        frozen = self.frozen()
+        for event in events:
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == pygame.KEYDOWN and not frozen:
+                return Menu(self.manager)
+        if not frozen and not self.thawed:
+            self.thawed = self.redraw = True
+        return self
+
+    def draw(self):
+        if not self.redraw:
+            return
+        screen = self.manager.screen
+        color = MENU_FONT_COLOR
+        screen.fill(GAME_OVER_COLOR)
+        TEXT.draw(screen, "Press any Key to Restart", color, 30, center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        TEXT.draw(screen, "Your Score: " + str(self.points), color, 30,
+                  center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
+        TEXT.draw(screen, "Your HighScore: " + str(LEADERBOARD.best(self.mode)), color, 30,
+                  center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100))
+        screen.blit(resources.RUNNING[0], (SCREEN_WIDTH // 2 - 20, SCREEN_HEIGHT // 2 - 140))
+
+    def expose(self):
+        # While frozen there is nothing to repaint the game from; the score comes soon enough
+        self.redraw = self.thawed
+
+
+class SceneManager:
+    """Runs one scene at a time in a single loop.
+
+    The manager owns what the scenes share: the screen, one Renderer for
+    every game, the frame clock, and the rates. tick_rate is the game's
+    ticks per second of wall-clock time and fps the cap on drawn frames
+    (0 for none); the soak test raises the one and drops the other to play
+    games quickly.
+    """
+
+    def __init__(self, screen=SCREEN, tick_rate=TICK_RATE, fps=RENDER_FPS, freeze=FREEZE_TIME):
+        self.screen = screen
+        self.tick_rate = tick_rate
+        self.fps = fps
+        self.freeze = freeze
+        self.renderer = Renderer(screen, settings.DIRTY_RECTS)
+        self.clock = pygame.time.Clock()
+        self.scene = None
+        self.frames = 0
+        self.transitions = 0
+
+    def switch(self, scene):
+        self.scene = scene
+        self.transitions += 1
+        if scene is not None:
+            scene.enter()
+
+    def poll(self):
+        """The events for the next frame. While the scene is idle, sleep until one comes or it wants a frame."""
+        wait = self.scene.wait()
+        if wait is None:
+            return pygame.event.get()
+        event = pygame.event.wait(wait)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def frame(self, events):
+        """Run the current scene for one frame. False once it has quit."""
+        now = time.perf_counter()
+        for event in events:
+            CONTROLS.handle(event, now)
+            PROFILER.handle(event)
+            THEME.handle(event)
+            if event.type in EXPOSE_EVENTS:
+                self.scene.expose()
+        scene = self.scene.update(events)
+        if scene is not self.scene:
+            self.switch(scene)
+            if scene is None:
+                return False
+        with PROFILER.scope("draw"):
+            scene.draw()
+        # Cap the frame rate, then update the display
+        with PROFILER.scope("tick"):
+            self.clock.tick(self.fps)
+        with PROFILER.scope("present"):
+            scene.present()
+        self.frames += 1
+        return True
+
+    def run(self, scene):
+        self.switch(scene)
+        while True:
+            with PROFILER.scope("events"):
+                events = self.poll()
+            if not self.frame(events):
+                break
+
+
+def idle_cpu(manager, scene, seconds):
+    """Share of one CPU the process uses while scene is shown for seconds."""
+    pygame.event.clear()
+    pygame.time.set_timer(pygame.QUIT, int(seconds * 1000), loops=1)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    manager.run(scene)
+    return (time.process_time() - cpu) / (time.perf_counter() - start)
+
+
+def key(key):
+    return pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0)
+
+
+def soak(restarts, modes=("single", "coop", "versus"), warmup=20):
+    """Play restarts games through the menus headless; return memory and liveness figures.
+
+    Each game is started from the title menu with key presses, paused and
+    resumed, played without input until the first crash and left through
+    the game over screen. The game clock runs a thousand times faster than normal.
+    """
+    manager = SceneManager(tick_rate=TICK_RATE * 1000, fps=0, freeze=0)
+    keys = {
+        "single": [pygame.K_RETURN, pygame.K_RETURN],
+        "coop": [pygame.K_RETURN, pygame.K_DOWN, pygame.K_RETURN, pygame.K_RETURN],
+        "versus": [pygame.K_RETURN, pygame.K_DOWN, pygame.K_RETURN, pygame.K_DOWN, pygame.K_RETURN],
+    }
+    manager.switch(Menu(manager))
+    depth = 0
+    start = time.perf_counter()
+    baseline = None
+    tracemalloc.start()
+    for game in range(restarts):
+        if game == warmup:
+            gc.collect()
+            baseline = tracemalloc.get_traced_memory()[0]
+        for press in keys[modes[game % len(modes)]] + [pygame.K_p, pygame.K_u]:
+            manager.frame([key(press)])
+        while isinstance(manager.scene, Playing):
+            manager.frame([])
+        depth = max(depth, stack_depth())
+        manager.frame([key(pygame.K_SPACE)])
+        if not isinstance(manager.scene, Menu):
+            raise RuntimeError("expected the menu after a game, got %r" % manager.scene)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "games": restarts,
+        "seconds": time.perf_counter() - start,
+        "frames": manager.frames,
+        "memory_growth_kb": (current - (baseline or current)) / 1024,
+        "peak_kb": peak / 1024,
+        "live_games": sum(isinstance(obj, Game) for obj in gc.get_objects()),
+        "stack_depth": depth,
+    }
+
+
+def stack_depth():
+    frame = sys._getframe()
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that memory stays flat over many restarts.")
+    parser.add_argument("--soak", type=int, default=300, help="games to play (default: %(default)s)")
+    parser.add_argument("--idle", type=float, default=0,
+                        help="instead, report CPU use over this many seconds on each idle screen")
+    parser.add_argument("--max-growth", type=float, default=256,
+                        help="KB of growth after the warm-up games that counts as a leak (default: %(default)s)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # the assets are found relative to here
+    import main
+    main.init(audio=False, leaderboard=None)
+    if args.idle:
+        manager = SceneManager()
+        screens = {
+            "menu": lambda: Menu(manager),
+            "paused": lambda: Paused(manager, Playing(manager, "single")),
+            "game over": lambda: GameOver(manager, Playing(manager, "single")),
+        }
+        for name, scene in screens.items():
+            print("%-10s %5.1f%% CPU" % (name, idle_cpu(manager, scene(), args.idle) * 100))
+        raise SystemExit(0)
+
+    # Keep the soak's scores and replays out of the real ones
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        LEADERBOARD.open()
+        result = soak(args.soak)
+        LEADERBOARD.close()
+    for name, value in result.items():
+        print("%-18s %s" % (name, round(value, 2) if isinstance(value, float) else value))
+    leaked = result["memory_growth_kb"] > args.max_growth or result["live_games"] > 1
+    raise SystemExit(1 if leaked else 0)
@@ -0,0 +1,313 @@
+"""
+The leaderboard: every finished game, kept in SQLite.
+
+Each game is a row of player, mode, score, duration (seconds played), seed
+and timestamp in LEADERBOARD_FILE. The database runs in WAL mode, so
+reading the leaderboard never waits for a write. Two indexes answer the
+two questions asked of it, a mode's top scores (mode, score) and a
+player's best (player, mode, score), by walking a few entries of one
+index, in well under a millisecond even with millions of games stored.
+
+The game loop never waits on the database. record() puts a finished game
+on a queue and returns; a writer thread inserts whatever has queued up in
+one transaction, at most BATCH_WAIT seconds later. The record of each mode,
+shown on the game over screen, is kept in memory, starting from the
+database's when it is opened.
+
+The first time a database is opened, the scores in an old highscore.txt
+next to it are imported as games of MIGRATED_PLAYER. That happens once;
+the file is left alone.
+
+    python scores.py --top 10 --mode single
+    python scores.py --player alice         # a player's best in every mode
+    python scores.py --bench 1000000        # fill a scratch database and time the queries
+"""
+import argparse
+import atexit
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+LEADERBOARD_FILE = "leaderboard.db"
+HIGHSCORE_FILE = "highscore.txt"
+MIGRATED_PLAYER = "highscore.txt"
+MODES = ("single", "coop", "versus")
+BATCH_SIZE = 1000  # most games inserted in one transaction
+BATCH_WAIT = 0.25  # seconds a recorded game may wait for others to be inserted with
+CLOSE_WAIT = 15.0  # most seconds close() waits for the writer thread, past the connection's busy timeout
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    duration REAL,
+    seed INTEGER,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_mode ON scores (mode, score DESC);
+CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, mode, score DESC);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+INSERT = "INSERT INTO scores (player, mode, score, duration, seed, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+TOP = "SELECT player, score, duration, seed, timestamp FROM scores WHERE mode = ? ORDER BY score DESC LIMIT ?"
+BEST = "SELECT MAX(score) FROM scores WHERE mode = ?"
+PERSONAL_BEST = "SELECT MAX(score) FROM scores WHERE player = ? AND mode = ?"
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute("PRAGMA journal_mode = WAL")
+    # In WAL mode this loses nothing on a crash of the game, only on one of the machine
+    connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+def read_highscores(path):
+    """The records in an old highscore file: a bare integer for single player, then "mode score" lines."""
+    with open(path, "r") as f:
+        words = f.read().split()
+    records = {}
+    if words:
+        records["single"] = int(words[0])
+    for mode, value in zip(words[1::2], words[2::2]):
+        if mode in MODES:
+            records[mode] = int(value)
+    return records
+
+
+def migrate(connection, path=HIGHSCORE_FILE):
+    """Import the highscore file at path, unless a database has done so before. Returns the games imported."""
+    if connection.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+        return 0
+    rows = []
+    if os.path.exists(path):
+        timestamp = os.path.getmtime(path)
+        rows = [(MIGRATED_PLAYER, mode, score, None, None, timestamp)
+                for mode, score in read_highscores(path).items() if score > 0]
+    with connection:
+        connection.executemany(INSERT, rows)
+        connection.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (os.path.abspath(path),))
+    return len(rows)
+
+
+class Leaderboard:
+    """Every game played, with each mode's record kept in memory.
+
+    Nothing is stored until open(); best() and submit() work before it.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.connection = None  # for reading, on the thread that opened it
+        self.queue = queue.Queue()
+        self.writer = None
+        self.records = dict.fromkeys(MODES, 0)
+        self.migrated = 0
+        self.recorded = 0
+        self.written = 0
+        self.lost = 0
+        self.batches = 0
+
+    def open(self, path=LEADERBOARD_FILE, highscores=None):
+        """Open (or create) the database at path and start the writer thread.
+
+        highscores is the old highscore file to migrate, by default the one
+        next to the database.
+        """
+        self.close()
+        self.path = os.path.abspath(path)
+        if highscores is None:
+            highscores = os.path.join(os.path.dirname(self.path), HIGHSCORE_FILE)
+        self.connection = connect(self.path)
+        self.connection.executescript(SCHEMA)
+        self.migrated = migrate(self.connection, highscores)
+        self.records = dict.fromkeys(MODES, 0)
+        for mode in MODES:
+            best, = self.connection.execute(BEST, (mode,)).fetchone()
+            self.records[mode] = best or 0
+        self.writer = threading.Thread(target=self.write, name="leaderboard", daemon=True)
+        self.writer.start()
+        return self
+
+    def best(self, mode="single"):
+        return self.records[mode]
+
+    def submit(self, mode, points):
+        """Count the points of a game still being played towards mode's record. Memory only."""
+        if points > self.records[mode]:
+            self.records[mode] = points
+
+    def record(self, player, mode, score, duration=None, seed=None):
+        """Store a finished game. Returns at once; the writer thread inserts it."""
+        self.submit(mode, score)
+        if self.writer is None:
+            return False
+        self.queue.put((player, mode, score, duration, seed, time.time()))
+        self.recorded += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every game recorded so far is in the database. False if timeout ran out first."""
+        if self.writer is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Insert what is queued, stop the writer thread and close the database."""
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join(CLOSE_WAIT)
+            self.writer = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def write(self):
+        """The writer thread: insert queued games in batches until close().
+
+        A batch the database refuses is reported and lost, and the thread
+        carries on, so that flush() and close() never wait on it in vain.
+        """
+        connection = None
+        running = True
+        while running:
+            batch = []
+            flushed = []
+            item = self.queue.get()
+            deadline = time.monotonic() + BATCH_WAIT
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    flushed.append(item)  # someone is waiting: insert now
+                    break
+                batch.append(item)
+                if len(batch) >= BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    if connection is None:
+                        connection = connect(self.path)
+                    with connection:
+                        connection.executemany(INSERT, batch)
+                except sqlite3.Error as error:
+                    self.lost += len(batch)
+                    print("leaderboard: %d games not stored: %s" % (len(batch), error), file=sys.stderr)
+                else:
+                    self.written += len(batch)
+                    self.batches += 1
+            for done in flushed:
+                done.set()
+        if connection is not None:
+            connection.close()
+
+    def top(self, mode="single", count=100):
+        """The count best games of mode, best first, as (player, score, duration, seed, timestamp)."""
+        return self.connection.execute(TOP, (mode, count)).fetchall()
+
+    def personal_best(self, player, mode="single"):
+        """player's best score in mode, or None if they have not played it."""
+        best, = self.connection.execute(PERSONAL_BEST, (player, mode)).fetchone()
+        return best
+
+    def stats(self):
+        return {"recorded": self.recorded, "written": self.written, "lost": self.lost, "batches": self.batches,
+                "queued": self.queue.qsize(), "migrated": self.migrated}
+
+
+LEADERBOARD = Leaderboard()
+atexit.register(LEADERBOARD.close)
+
+
+def percentiles(times):
+    ordered = sorted(times)
+    return ordered[len(ordered) // 2] * 1000, ordered[int(len(ordered) * 0.99)] * 1000
+
+
+def bench(rows, players=1000, queries=200):
+    """Record rows random games into a scratch database and time the writes and the queries."""
+    rng = random.Random(0)
+    names = ["player%d" % index for index in range(players)]
+    with tempfile.TemporaryDirectory() as directory:
+        board = Leaderboard().open(os.path.join(directory, LEADERBOARD_FILE))
+        start = time.perf_counter()
+        for _ in range(rows):
+            board.record(rng.choice(names), rng.choice(MODES), int(rng.expovariate(1 / 800)),
+                         rng.uniform(1, 120), rng.getrandbits(63))
+        queued = time.perf_counter() - start
+        board.flush()
+        written = time.perf_counter() - start
+
+        top = []
+        for _ in range(queries):
+            before = time.perf_counter()
+            board.top(rng.choice(MODES), 100)
+            top.append(time.perf_counter() - before)
+        personal = []
+        for _ in range(queries):
+            before = time.perf_counter()
+            board.personal_best(rng.choice(names), rng.choice(MODES))
+            personal.append(time.perf_counter() - before)
+        plans = [row[-1] for query, parameters in ((TOP, ("single", 100)), (PERSONAL_BEST, ("player0", "single")))
+                 for row in board.connection.execute("EXPLAIN QUERY PLAN " + query, parameters)]
+        stats = board.stats()
+        board.close()
+        start = time.perf_counter()
+        Leaderboard().open(os.path.join(directory, LEADERBOARD_FILE)).close()
+        reopened = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "record_us": queued / rows * 1e6,
+        "rows_per_second": rows / written,
+        "batches": stats["batches"],
+        "top100_ms": percentiles(top),
+        "personal_best_ms": percentiles(personal),
+        "open_ms": reopened * 1000,
+        "plans": plans,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the leaderboard, or time it on a scratch database.")
+    parser.add_argument("--database", help="default: the game's own, next to this file")
+    parser.add_argument("--mode", choices=MODES, default="single")
+    parser.add_argument("--top", type=int, default=10, help="how many of the best games to show")
+    parser.add_argument("--player", help="show this player's best in every mode instead")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="record ROWS random games and time the queries")
+    args = parser.parse_args()
+
+    if args.bench:
+        result = bench(args.bench)
+        print("%d games recorded at %.2f us each on the game's side, %.0f rows/s written in %d batches"
+              % (result["rows"], result["record_us"], result["rows_per_second"], result["batches"]))
+        print("top 100 of a mode:  p50 %.3f ms, p99 %.3f ms" % result["top100_ms"])
+        print("a player's best:    p50 %.3f ms, p99 %.3f ms" % result["personal_best_ms"])
+        print("opening it:         %.1f ms" % result["open_ms"])
+        for plan in result["plans"]:
+            print("plan: " + plan)
+        raise SystemExit(0)
+
+    database = args.database or os.path.join(os.path.dirname(os.path.abspath(__file__)), LEADERBOARD_FILE)
+    board = LEADERBOARD.open(database)
+    if args.player:
+        for mode in MODES:
+            print("%-7s %s" % (mode, board.personal_best(args.player, mode) or "-"))
+    else:
+        for rank, (player, score, duration, seed, timestamp) in enumerate(board.top(args.mode, args.top), 1):
+            played = time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+            length = "%.0f s" % duration if duration is not None else "-"
+            print("%3d. %-20s %7d  %8s  %s" % (rank, player, score, length, played))
@@ -1,14 +1,57 @@
+import os
+
 import pygame
 
+from startup import STARTUP
+
 SCREEN_HEIGHT = 1080
 SCREEN_WIDTH = 1920
-SCREEN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 
-pygame.display.set_caption("Chrome Dino Runner")
+FONT_COLOR=(0,0,0)
 
-Ico = pygame.image.load("assets/DinoWallpaper.png")
-pygame.display.set_icon(Ico)
+# The game logic advances in fixed ticks of 1 / TICK_RATE seconds, however
+# fast frames are drawn. Speeds are given per second; the per-tick values are
+# derived from them.
+TICK_RATE = 60
+SCROLL_SPEED = 900  # pixels per second
+GAME_SPEED = SCROLL_SPEED // TICK_RATE  # pixels per tick
+
+# Cap on drawn frames per second, 0 for no cap
+RENDER_FPS = 144
+
+# Redraw and present only what moved each frame. main.py --full-redraw turns
+# this off to compare against refilling the whole screen.
+DIRTY_RECTS = True
+
+# Players in a coop or versus game, each on their own keys (see dinosaur.KEYMAPS).
+# main.py --players N changes it.
+LOCAL_PLAYERS = 2
+
+# The name finished games are stored under in the leaderboard. main.py --name changes it.
+PLAYER_NAME = os.environ.get("USER") or os.environ.get("USERNAME") or "player"
+
+_screen = None
+
+
+def init_display():
+    """Open the game window. Safe to call more than once."""
+    global _screen
+    if _screen is None:
+        with STARTUP.phase("display"):
+            _screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Chrome Dino Runner")
+            Ico = pygame.image.load("assets/DinoWallpaper.png")
+            pygame.display.set_icon(Ico)
+    return _screen
+
+
+class LazyScreen:
+    """Stands in for the display surface until something draws on it."""
+
+    def __getattr__(self, name):
+        attr = getattr(init_display(), name)
+        self.__dict__[name] = attr
+        return attr
 
-FONT_COLOR=(0,0,0)
 
-GAME_SPEED = 15
\ No newline at end of file
+SCREEN = LazyScreen()
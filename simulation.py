@@ -0,0 +1,180 @@
+"""
+Render-free game core shared by the windowed game loops and headless runs.
+
+A `Game` owns everything that changes from tick to tick: the players, the
+obstacles, the distance scrolled and the score. `Game.step()` takes one
+JUMP/DUCK bitmask per player and advances the world by one frame without
+touching the display, the clock or the keyboard, so the same rules can be run
+in a window at 60 fps or headless as fast as Python allows.
+
+Run `python simulation.py` for a quick throughput check.
+"""
+import argparse
+import random
+import time
+
+import collision
+import resources
+from dinosaur import MAX_PLAYERS, player
+from obstacles import ObstacleManager, SmallCactus, LargeCactus, Bird, Powerup, Speedup
+from settings import GAME_SPEED, TICK_RATE
+
+MILESTONE = 1000  # points between two milestones
+
+# Each mode gives its number of players and the obstacle kinds it spawns, with the
+# sprite list they use and their relative odds. The odds keep the ratios the
+# old spawn dice gave (a 1 in roll+1 chance per kind, tried in order).
+MODES = {
+    "single": {
+        "players": 1,
+        "spawn": [(SmallCactus, "SMALL_CACTUS", 25), (LargeCactus, "LARGE_CACTUS", 20), (Bird, "BIRD", 16),
+                  (Powerup, "POWERUP", 13), (Speedup, "SPEEDUP", 10)],
+    },
+    "coop": {
+        "players": 2,
+        "spawn": [(SmallCactus, "SMALL_CACTUS", 9), (LargeCactus, "LARGE_CACTUS", 6), (Bird, "BIRD", 4)],
+    },
+    "versus": {
+        "players": 2,
+        "spawn": [(SmallCactus, "SMALL_CACTUS", 16), (LargeCactus, "LARGE_CACTUS", 12), (Bird, "BIRD", 9)],
+    },
+}
+
+
+class Game:
+    """One running game. Nothing in here draws or reads input."""
+
+    def __init__(self, mode="single", seed=None, players=None):
+        self.mode = mode
+        self.rules = MODES[mode]
+        # Every game gets its own generator, seeded so that it can be replayed
+        self.seed = random.getrandbits(63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        count = players or self.rules["players"]
+        if not 1 <= count <= MAX_PLAYERS:
+            raise ValueError("a game takes 1 to %d players, not %d" % (MAX_PLAYERS, count))
+        self.players = [player(index) for index in range(count)]
+        spawn = self.rules["spawn"]
+        self.obstacle_manager = ObstacleManager([(kind, getattr(resources, sprites)) for kind, sprites, _ in spawn],
+                                                [weight for _, _, weight in spawn], self.rng)
+        self.obstacles = self.obstacle_manager.active
+        self.game_speed = GAME_SPEED
+        self.distance = 0
+        self.prev_distance = 0
+        self.points = 0
+        self.ticks = 0
+        self.crashed = []
+        self.game_over = False
+        self.recorder = None  # a replay.Recorder, if the game is being recorded
+        # Told about jumps, pickups, crashes and milestones, e.g. audio.AUDIO
+        self.observer = None
+
+    def step(self, inputs):
+        """Advance one tick. Returns False once a player has crashed."""
+        if self.game_over:
+            return False
+
+        if self.recorder is not None:
+            self.recorder.record(inputs)
+        observer = self.observer
+        if observer is None:
+            for player, actions in zip(self.players, inputs):
+                player.step(actions)
+        else:
+            for index, (player, actions) in enumerate(zip(self.players, inputs)):
+                player.step(actions)
+                if player.dino_jump and player.arc_tick == 0:
+                    observer.jumped(index)  # only a jump that starts this tick leaves arc_tick at 0
+        self.obstacle_manager.update(self.distance)
+        self.collide()
+        self.obstacle_manager.sweep()
+        if self.game_over:
+            return False
+
+        self.prev_distance = self.distance
+        self.distance += self.game_speed
+        self.points += 1
+        self.ticks += 1
+        if observer is not None and self.points % MILESTONE == 0:
+            observer.milestone(self.points)
+        return True
+
+    def save(self):
+        """A snapshot of everything the next tick depends on, to go back to with load()."""
+        return (self.ticks, self.points, self.distance, self.prev_distance, self.game_speed,
+                self.game_over, tuple(self.crashed), self.rng.getstate(),
+                [player.save() for player in self.players], self.obstacle_manager.save())
+
+    def load(self, state):
+        (self.ticks, self.points, self.distance, self.prev_distance, self.game_speed,
+         self.game_over, crashed, rng, players, obstacles) = state
+        self.crashed[:] = crashed
+        self.rng.setstate(rng)
+        for player, saved in zip(self.players, players):
+            player.load(saved)
+        self.obstacle_manager.load(obstacles)
+
+    def scrolled(self, alpha=1.0):
+        """Distance scrolled, alpha of the way from the previous tick to this one."""
+        return self.prev_distance + (self.distance - self.prev_distance) * alpha
+
+    def collide(self):
+        collected = set()
+        for index, obstacle in collision.collisions(self.players, self.obstacles):
+            player = self.players[index]
+            if obstacle in collected:
+                continue  # an earlier player already picked it up
+            if isinstance(obstacle, Powerup):
+                self.obstacle_manager.remove(obstacle)
+                collected.add(obstacle)
+                player.boost(5)
+            elif isinstance(obstacle, Speedup):
+                self.obstacle_manager.remove(obstacle)
+                collected.add(obstacle)
+                player.dino_run += 5
+            else:
+                self.crashed.append(index)
+                self.game_over = True
+                if self.observer is not None:
+                    self.observer.crashed(index)
+                continue
+            if self.observer is not None:
+                self.observer.picked_up(index, obstacle)
+
+
+def idle(game):
+    """Policy that never presses anything."""
+    return [0] * len(game.players)
+
+
+def simulate(policy=idle, mode="single", seed=None, max_ticks=100000, players=None):
+    """Play one game headless until a crash or max_ticks and return it."""
+    if resources.ATLAS is None:
+        resources.load(headless=True)
+    game = Game(mode, seed, players)
+    while game.ticks < max_ticks and game.step(policy(game)):
+        pass
+    return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless games and report throughput.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--mode", choices=sorted(MODES), default="single")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--players", type=int, help="players per game, instead of the mode's own")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ticks = spawned = allocated = 0
+    for episode in range(args.games):
+        game = simulate(mode=args.mode, seed=args.seed + episode, players=args.players)
+        ticks += game.ticks
+        spawned += game.obstacle_manager.spawned
+        allocated += game.obstacle_manager.allocated
+    elapsed = time.perf_counter() - start
+    minutes = ticks / TICK_RATE / 60
+    print("%d games, %d ticks in %.2f s: %.0f ticks/s, %.0fx real time"
+          % (args.games, ticks, elapsed, ticks / elapsed, ticks / elapsed / TICK_RATE))
+    print("obstacles: %.1f spawned and %.1f allocated per game minute"
+          % (spawned / minutes, allocated / minutes))
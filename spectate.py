@@ -0,0 +1,611 @@
+"""
+Live games for spectators, streamed as compact binary deltas.
+
+With `main.py --broadcast PORT` every game played is streamed to anyone
+who connects to PORT on this machine, and `python spectate.py --watch
+HOST:PORT` shows it in a window of its own, drawn with the game's sprites.
+
+What a spectator sees is a View: the score, the distance scrolled (which
+places the clouds and the track), each player's height and sprite, and
+each obstacle's kind, position and frame. The sending side keeps a View of
+its own, and on every tick both move it forward the way Game.step() moves
+the game: the score counts up and the obstacles scroll. Only what that
+guess got wrong is sent, as a small message of flagged sections: a player
+jumping or ducking, an obstacle appearing or being picked up, a crash. A
+tick where nothing surprising happened is a two-byte message. A spectator
+who connects is sent the whole View once, then the deltas.
+
+The server runs on asyncio in a thread of its own. The game thread only
+encodes each tick once and hands the frame's messages over; the same bytes
+are written to every spectator. Each spectator's send queue is its
+transport's write buffer, capped at QUEUE_BYTES; one that falls that far
+behind is dropped, and the game never waits for anyone.
+
+    python spectate.py --watch 127.0.0.1:5556
+    python spectate.py --load 300 --slow 20   # 300 spectators over localhost, 20 of which read too slowly
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+
+import pygame
+
+import background
+import resources
+from dinosaur import Dinosaur
+from obstacles import Bird, LargeCactus, Powerup, SmallCactus, Speedup
+from settings import GAME_SPEED, RENDER_FPS, TICK_RATE
+
+PORT = 5556
+QUEUE_BYTES = 4096  # most a spectator may fall behind before it is dropped
+SEND_BUFFER = 4096  # the kernel's share of that, per spectator
+RECONNECT = 1.0  # seconds a spectator waits before connecting again
+
+LENGTH = struct.Struct(">H")  # each message is prefixed with its length
+HEADER = struct.Struct(">BB")  # kind, sections
+KEY, DELTA = range(2)
+# Sections, in the order they follow the header
+POINTS = 1  # I score
+DISTANCE = 2  # I distance scrolled
+OVER = 4  # no data; a player has crashed
+PLAYERS = 8  # B count, then B player, h y, B sprite each
+REMOVED = 16  # B count, then B obstacle each
+PLACED = 32  # B count, then B obstacle, B kind, h x, h y, B frame each
+UINT = struct.Struct(">I")
+COUNT = struct.Struct(">B")
+PLAYER = struct.Struct(">BhB")
+PLACE = struct.Struct(">BBhhB")
+
+# Obstacle kinds by number, with the sprites they are drawn with
+KINDS = [(SmallCactus, "SMALL_CACTUS"), (LargeCactus, "LARGE_CACTUS"), (Bird, "BIRD"),
+         (Powerup, "POWERUP"), (Speedup, "SPEEDUP")]
+KIND_NUMBERS = {kind: number for number, (kind, _) in enumerate(KINDS)}
+
+
+def player_sprites():
+    """The sprites a player can show, by number."""
+    return resources.RUNNING + resources.DUCKING + [resources.JUMPING]
+
+
+def frame(obstacle):
+    """Which of its sprites obstacle shows: a bird's flap, or any other obstacle's type."""
+    return obstacle.index if isinstance(obstacle, Bird) else obstacle.type
+
+
+def place(obstacle, x, y, number):
+    obstacle.rect.x = obstacle.prev_x = x
+    obstacle.rect.y = y
+    if isinstance(obstacle, Bird):
+        obstacle.index = number
+    else:
+        obstacle.type = number
+    obstacle.rect.size = obstacle.sprite().get_size()
+
+
+class View:
+    """What a spectator sees of a game, kept up to date from messages."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.messages = 0
+        self.clear()
+
+    def clear(self):
+        self.points = 0
+        self.distance = 0
+        self.over = False
+        self.players = []  # [y, sprite]
+        self.obstacles = {}  # number -> Obstacle, in the order they appeared
+
+    def advance(self):
+        """Move on one tick the way Game.step() would with nothing unexpected happening."""
+        if self.over:
+            return
+        self.points += 1
+        self.distance += GAME_SPEED
+        for number, obstacle in list(self.obstacles.items()):
+            if not obstacle.update():
+                del self.obstacles[number]
+
+    def update(self, points, distance, over, players, removed, placed):
+        """Apply the sections of a message, after advance() or clear()."""
+        if points is not None:
+            self.points = points
+        if distance is not None:
+            self.distance = distance
+        self.over = over
+        for index, y, sprite in players:
+            while len(self.players) <= index:
+                self.players.append([Dinosaur.Y_POS, 0])
+            self.players[index][:] = y, sprite
+        for number in removed:
+            self.obstacles.pop(number, None)
+        for number, kind, x, y, sprite in placed:
+            obstacle = self.obstacles.get(number)
+            if obstacle is None or KIND_NUMBERS[type(obstacle)] != kind:
+                kind, images = KINDS[kind]
+                obstacle = self.obstacles[number] = kind(getattr(resources, images))
+            place(obstacle, x, y, sprite)
+
+    def feed(self, data):
+        """Apply every whole message in data, keeping any part of one for the next call."""
+        buffer = self.buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= LENGTH.size:
+            length, = LENGTH.unpack_from(buffer, offset)
+            end = offset + LENGTH.size + length
+            if end > len(buffer):
+                break
+            self.apply(buffer, offset + LENGTH.size)
+            offset = end
+        del buffer[:offset]
+
+    def apply(self, data, offset=0):
+        kind, sections = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        if kind == KEY:
+            self.clear()
+        else:
+            self.advance()
+        self.messages += 1
+        self.update(*decode(sections, data, offset))
+
+    def checksum(self):
+        obstacles = [(number, KIND_NUMBERS[type(obstacle)], tuple(obstacle.rect), frame(obstacle))
+                     for number, obstacle in self.obstacles.items()]
+        return zlib.crc32(repr((self.points, self.distance, self.over, self.players, obstacles)).encode())
+
+    def draw(self, screen, color):
+        from text import TEXT
+        background.BACKGROUND.draw_back(screen, self.distance)
+        sprites = player_sprites()
+        for index in reversed(range(len(self.players))):
+            y, sprite = self.players[index]
+            screen.blit(resources.SKIN[sprites[sprite]], (Dinosaur.X_POS - index * Dinosaur.X_SPACING, y))
+        for obstacle in self.obstacles.values():
+            obstacle.draw(screen)
+        background.BACKGROUND.draw_front(screen, self.distance)
+        TEXT.draw_number(screen, self.points, color, 20, (1000, 40), prefix="Live: ")
+
+
+def encode(kind, points, distance, over, players, removed, placed):
+    sections = 0
+    body = bytearray()
+    if points is not None:
+        sections |= POINTS
+        body += UINT.pack(points)
+    if distance is not None:
+        sections |= DISTANCE
+        body += UINT.pack(distance)
+    if over:
+        sections |= OVER
+    if players:
+        sections |= PLAYERS
+        body += COUNT.pack(len(players))
+        for player in players:
+            body += PLAYER.pack(*player)
+    if removed:
+        sections |= REMOVED
+        body += COUNT.pack(len(removed))
+        body += bytes(removed)
+    if placed:
+        sections |= PLACED
+        body += COUNT.pack(len(placed))
+        for obstacle in placed:
+            body += PLACE.pack(*obstacle)
+    return LENGTH.pack(HEADER.size + len(body)) + HEADER.pack(kind, sections) + body
+
+
+def decode(sections, data, offset):
+    points = distance = None
+    players = removed = placed = ()
+    if sections & POINTS:
+        points, = UINT.unpack_from(data, offset)
+        offset += UINT.size
+    if sections & DISTANCE:
+        distance, = UINT.unpack_from(data, offset)
+        offset += UINT.size
+    if sections & PLAYERS:
+        count = data[offset]
+        players = [PLAYER.unpack_from(data, offset + 1 + index * PLAYER.size) for index in range(count)]
+        offset += 1 + count * PLAYER.size
+    if sections & REMOVED:
+        count = data[offset]
+        removed = data[offset + 1:offset + 1 + count]
+        offset += 1 + count
+    if sections & PLACED:
+        count = data[offset]
+        placed = [PLACE.unpack_from(data, offset + 1 + index * PLACE.size) for index in range(count)]
+    return points, distance, bool(sections & OVER), players, removed, placed
+
+
+def keyframe(view):
+    """A message that sets a cleared View to view."""
+    players = [(index, y, sprite) for index, (y, sprite) in enumerate(view.players)]
+    placed = [(number, KIND_NUMBERS[type(obstacle)], obstacle.rect.x, obstacle.rect.y, frame(obstacle))
+              for number, obstacle in view.obstacles.items()]
+    return encode(KEY, view.points, view.distance, view.over, players, (), placed)
+
+
+class Encoder:
+    """Turns each tick of a game into the message that brings a View from the last tick up to it."""
+
+    def __init__(self):
+        self.view = View()
+        self.game = None  # a weak reference, so a finished game can go
+        self.numbers = {}  # obstacle in the game -> its number in the view
+        self.next_number = 0
+        self.sprites = None
+
+    def encode(self, game):
+        view = self.view
+        if self.sprites is None:
+            self.sprites = {sprite: number for number, sprite in enumerate(player_sprites())}
+        if self.game is None or self.game() is not game:
+            self.game = weakref.ref(game)
+            self.numbers.clear()
+            view.clear()
+            kind = KEY
+        else:
+            view.advance()
+            kind = DELTA
+
+        points = game.points if game.points != view.points else None
+        distance = game.distance if game.distance != view.distance else None
+        players = []
+        for index, player in enumerate(game.players):
+            state = [player.dino_rect.y, self.sprites[player.image]]
+            if index >= len(view.players) or view.players[index] != state:
+                players.append((index, state[0], state[1]))
+
+        placed = []
+        seen = set()
+        for obstacle in game.obstacles:
+            number = self.numbers.get(obstacle)
+            if number is None:
+                number = self.numbers[obstacle] = self.number()
+            seen.add(number)
+            shown = view.obstacles.get(number)
+            kind_number = KIND_NUMBERS[type(obstacle)]
+            if (shown is None or type(shown) is not type(obstacle) or shown.rect.topleft != obstacle.rect.topleft
+                    or frame(shown) != frame(obstacle)):
+                placed.append((number, kind_number, obstacle.rect.x, obstacle.rect.y, frame(obstacle)))
+        removed = [number for number in view.obstacles if number not in seen]
+        for obstacle in [obstacle for obstacle, number in self.numbers.items() if number not in seen]:
+            del self.numbers[obstacle]
+
+        view.update(points, distance, game.game_over, players, removed, placed)
+        return encode(kind, points, distance, game.game_over, players, removed, placed)
+
+    def number(self):
+        """A free obstacle number; a byte is plenty for what fits on screen."""
+        while self.next_number in self.view.obstacles or self.next_number in self.numbers.values():
+            self.next_number = (self.next_number + 1) % 256
+        number = self.next_number
+        self.next_number = (number + 1) % 256
+        return number
+
+
+class Spectator(asyncio.Protocol):
+    """One connected spectator. Nothing is read from it."""
+
+    def __init__(self, broadcast):
+        self.broadcast = broadcast
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        transport.set_write_buffer_limits(high=QUEUE_BYTES)
+        self.broadcast.join(self)
+
+    def pause_writing(self):
+        # More than QUEUE_BYTES are waiting: it is not keeping up
+        self.broadcast.drop(self)
+
+    def connection_lost(self, exc):
+        self.broadcast.leave(self)
+
+
+class Broadcast:
+    """Streams every game played to the spectators connected to a local port.
+
+    Call publish(game) on every tick and flush() once a frame; both only
+    encode and hand over, everything else happens on the server's thread.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.loop = None
+        self.thread = None
+        self.server = None
+        self.encoder = Encoder()
+        self.mirror = View()  # the view as of the last flush, on the server's thread, for newcomers
+        self.pending = []
+        self.clients = set()
+        self.ticks = 0
+        self.bytes = 0
+        self.joined = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.busy = 0.0  # seconds the server's thread spent writing to spectators
+
+    def start(self, port=PORT, host="127.0.0.1"):
+        """Listen on host:port (port 0 for any free one) and return the port."""
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: Spectator(self), host, port, backlog=1024))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="broadcast", daemon=True)
+        self.thread.start()
+        self.enabled = True
+        return self.server.sockets[0].getsockname()[1]
+
+    def publish(self, game):
+        message = self.encoder.encode(game)
+        self.pending.append(message)
+        self.ticks += 1
+        self.bytes += len(message)
+
+    def flush(self):
+        if self.pending:
+            data = b"".join(self.pending)
+            self.pending.clear()
+            self.loop.call_soon_threadsafe(self.fan_out, data)
+
+    def fan_out(self, data):
+        start = time.perf_counter()
+        self.mirror.feed(data)
+        for client in list(self.clients):
+            client.transport.write(data)
+        self.flushes += 1
+        self.busy += time.perf_counter() - start
+
+    def join(self, client):
+        self.clients.add(client)
+        self.joined += 1
+        client.transport.write(keyframe(self.mirror))
+
+    def drop(self, client):
+        if client in self.clients:
+            self.clients.discard(client)
+            self.dropped += 1
+            client.transport.abort()
+
+    def leave(self, client):
+        self.clients.discard(client)
+
+    def stop(self, timeout=1.0):
+        """Send what is left, close every connection and stop the server's thread."""
+        if not self.enabled:
+            return
+        self.flush()
+        asyncio.run_coroutine_threadsafe(self.shutdown(timeout), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.enabled = False
+
+    async def shutdown(self, timeout):
+        self.server.close()
+        for client in list(self.clients):
+            client.transport.close()  # after what is still buffered has gone out
+        deadline = self.loop.time() + timeout
+        while self.clients and self.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        for client in list(self.clients):
+            client.transport.abort()
+
+
+BROADCAST = Broadcast()
+
+
+def watch(host, port):
+    """Show the game streamed from host:port in a window, connecting again whenever the stream ends."""
+    import settings
+    from renderer import Renderer
+    from theme import THEME
+
+    pygame.init()
+    screen = settings.init_display()
+    pygame.display.set_caption("Chrome Dino Runner - %s:%d" % (host, port))
+    resources.load()
+    background.load()
+    THEME.start()
+    renderer = Renderer(screen, settings.DIRTY_RECTS)
+    clock = pygame.time.Clock()
+    view = View()
+    connection = None
+    retry = 0.0
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+            THEME.handle(event)
+        if connection is None and time.monotonic() >= retry:
+            try:
+                connection = socket.create_connection((host, port), timeout=RECONNECT)
+                connection.setblocking(False)
+            except OSError:
+                retry = time.monotonic() + RECONNECT
+        if connection is not None:
+            try:
+                while True:
+                    data = connection.recv(65536)
+                    if not data:
+                        raise ConnectionResetError
+                    view.feed(data)
+            except BlockingIOError:
+                pass
+            except OSError:
+                connection.close()
+                connection = None
+                view.buffer.clear()
+                retry = time.monotonic() + RECONNECT
+
+        THEME.begin(renderer)
+        for target in THEME.passes(renderer):
+            view.draw(target, THEME.font)
+        clock.tick(RENDER_FPS)
+        renderer.present()
+
+
+async def spectate(host, port, results):
+    """One test spectator that keeps up: decode everything until the stream ends."""
+    reader, writer = await asyncio.open_connection(host, port)
+    view = View()
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            view.feed(data)
+    except ConnectionError:
+        results["reset"] += 1
+        return
+    finally:
+        writer.close()
+    results["checksums"].append(view.checksum())
+    results["messages"] += view.messages
+
+
+def read_slowly(host, port, until):
+    """One test spectator that reads 64 bytes a second until until.
+
+    A blocking socket with a small receive buffer, so that what it leaves
+    unread backs up into the server's write buffer; a StreamReader would
+    read everything into a buffer of its own.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)  # before connecting, so the window stays small
+    try:
+        sock.connect((host, port))
+        while time.monotonic() < until:
+            time.sleep(1.0)
+            if not sock.recv(64):
+                break
+    except ConnectionError:
+        pass  # dropped, as it should be
+    finally:
+        sock.close()
+
+
+async def spectators(host, port, count, slow, seconds):
+    results = {"checksums": [], "messages": 0, "reset": 0}
+    until = time.monotonic() + seconds
+    threads = [threading.Thread(target=read_slowly, args=(host, port, until), daemon=True)
+               for _ in range(slow)]
+    for thread in threads:
+        thread.start()
+    await asyncio.gather(*[spectate(host, port, results) for _ in range(count)])
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def load_test(count, slow, seconds, speed, policy_name):
+    """Stream bot games to count spectators and slow ones in another process; report the cost to the game."""
+    import policies
+    from simulation import Game
+
+    resources.load(headless=True)
+    port = BROADCAST.start(0)
+    command = [sys.executable, os.path.abspath(__file__), "--spectators", str(count), "--slow", str(slow),
+               "--port", str(port), "--seconds", str(seconds + 5)]
+    results_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+    results_file.close()
+    command += ["--results", results_file.name]
+    process = subprocess.Popen(command, env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"})
+    deadline = time.monotonic() + 30
+    while BROADCAST.joined < count + slow and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    policy = policies.load(policy_name)
+    seed = 0
+    game = Game("versus", seed)
+    costs = []
+    late = frames = games = 0
+    frame_time = 1.0 / TICK_RATE
+    next_frame = start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        # One frame: speed ticks, each published, then one flush
+        spent = 0.0
+        for _ in range(speed):
+            alive = game.step(policy(game))
+            before = time.perf_counter()
+            BROADCAST.publish(game)
+            spent += time.perf_counter() - before
+            if not alive:
+                games += 1
+                seed += 1
+                game = Game("versus", seed)
+        before = time.perf_counter()
+        BROADCAST.flush()
+        costs.append(spent + time.perf_counter() - before)
+        frames += 1
+        next_frame += frame_time
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -frame_time:
+            late += 1
+    connected = len(BROADCAST.clients)
+    BROADCAST.stop()
+    process.wait()
+    with open(results_file.name, "r") as f:
+        results = json.load(f)
+    os.remove(results_file.name)
+    expected = BROADCAST.mirror.checksum()
+    in_sync = sum(checksum == expected for checksum in results["checksums"])
+    costs.sort()
+    print("%d spectators (%d slow), %d still connected at the end, %d dropped"
+          % (count + slow, slow, connected, BROADCAST.dropped))
+    print("%d ticks in %d frames (%d games), %.1f bytes per tick, %d ticks a second to each spectator"
+          % (BROADCAST.ticks, frames, games + 1, BROADCAST.bytes / BROADCAST.ticks, speed * TICK_RATE))
+    print("game thread: publish and flush p50 %.1f us, p99 %.1f us per frame; %d frames more than a frame late"
+          % (costs[len(costs) // 2] * 1e6, costs[int(len(costs) * 0.99)] * 1e6, late))
+    print("server thread: %.0f us per flush to write it to every spectator"
+          % (BROADCAST.busy / max(1, BROADCAST.flushes) * 1e6))
+    print("%d of %d spectators that kept up ended on the game's view; %d messages decoded"
+          % (in_sync, len(results["checksums"]), results["messages"]))
+    return in_sync == len(results["checksums"]) == count and BROADCAST.dropped == slow
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a game streamed by main.py --broadcast, or load test the stream.")
+    parser.add_argument("--watch", metavar="HOST:PORT", help="show the game streamed from HOST:PORT")
+    parser.add_argument("--load", type=int, metavar="N", help="stream bot games to N spectators over localhost")
+    parser.add_argument("--slow", type=int, default=0, help="spectators on top of those that read too slowly")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--speed", type=int, default=8, help="ticks per frame in the load test, so slow spectators fall behind sooner")
+    parser.add_argument("--policy", default="planner", help="bot policy for the load test")
+    parser.add_argument("--spectators", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--results", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.spectators is not None:
+        # The load test's spectators, in a process of their own
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        resources.load(headless=True)
+        results = asyncio.run(spectators("127.0.0.1", args.port, args.spectators, args.slow, args.seconds))
+        with open(args.results, "w") as f:
+            json.dump(results, f)
+    elif args.load is not None:
+        raise SystemExit(0 if load_test(args.load, args.slow, args.seconds, args.speed, args.policy) else 1)
+    elif args.watch:
+        host, _, port = args.watch.rpartition(":")
+        watch(host, int(port))
+    else:
+        parser.error("give --watch or --load")
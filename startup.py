@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """Wall-clock time spent in each startup phase, in milliseconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, name, since=None):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - (since or self.started)) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name, start)
+
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self):
+        lines = ["Startup:"]
+        for name, ms in self.phases.items():
+            lines.append("  %-8s %8.1f ms" % (name, ms))
+        lines.append("  %-8s %8.1f ms" % ("total", self.total()))
+        return "\n".join(lines)
+
+
+STARTUP = StartupReport()
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+import pygame
+
+FONT_NAME = "freesansbold.ttf"
+DIGITS = "0123456789"
+
+
+class TextRenderer:
+    """Caches fonts by size and rendered labels by (text, color, size).
+
+    Labels are evicted least-recently-used once more than max_surfaces are
+    held. Numbers that change every frame should go through draw_number(),
+    which blits digit glyphs instead of rendering a new surface; the glyphs
+    of DIGITS are rendered once per color and size and never evicted.
+    """
+
+    def __init__(self, font_name=FONT_NAME, max_surfaces=256):
+        self.font_name = font_name
+        self.max_surfaces = max_surfaces
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.digits = {}  # (color, size) -> {digit: glyph}
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self.fonts[size] = pygame.font.Font(self.font_name, size)
+        return font
+
+    def render(self, text, color, size=30):
+        key = (text, tuple(color), size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def digit_glyphs(self, color, size):
+        key = (tuple(color), size)
+        glyphs = self.digits.get(key)
+        if glyphs is None:
+            font = self.font(size)
+            glyphs = self.digits[key] = {digit: font.render(digit, True, color) for digit in DIGITS}
+        return glyphs
+
+    def draw(self, screen, text, color, size=30, center=None):
+        surface = self.render(text, color, size)
+        rect = surface.get_rect(center=center)
+        screen.blit(surface, rect)
+        return rect
+
+    def draw_number(self, screen, value, color, size, center, prefix=""):
+        """Draw prefix + value centered on center, one digit glyph at a time."""
+        cached = self.digit_glyphs(color, size)
+        glyphs = [cached.get(digit) or self.render(digit, color, size) for digit in str(value)]
+        label = self.render(prefix, color, size) if prefix else None
+
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = glyphs[0].get_height()
+        if label is not None:
+            width += label.get_width()
+        x = center[0] - width // 2
+        y = center[1] - height // 2
+
+        if label is not None:
+            screen.blit(label, (x, y))
+            x += label.get_width()
+        for glyph in glyphs:
+            screen.blit(glyph, (x, y))
+            x += glyph.get_width()
+        return pygame.Rect(center[0] - width // 2, y, width, height)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.surfaces)}
+
+
+TEXT = TextRenderer()
@@ -0,0 +1,140 @@
+"""
+Light and dark mode, switched on a schedule.
+
+The game is dark from DARK_FROM until DARK_UNTIL o'clock. The schedule is
+checked once when the game starts, and a one-shot pygame timer is armed
+for the next change, so no frame looks at the clock. Every sprite has a
+dark, colour-inverted copy built when the atlas loads (`resources.SKINS`);
+switching theme points `resources.SKIN` at the other set, and the old
+theme fades out over FADE_TIME seconds.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pygame
+
+import resources
+
+DARK_FROM = 22  # o'clock
+DARK_UNTIL = 6
+PALETTES = {
+    "light": {"background": (255, 255, 255), "font": (0, 0, 0)},
+    "dark": {"background": (30, 30, 30), "font": (255, 255, 255)},
+}
+FADE_TIME = 1.0  # seconds
+THEME_EVENT = pygame.event.custom_type()
+
+
+def is_dark(now):
+    return now.hour >= DARK_FROM or now.hour < DARK_UNTIL
+
+
+def next_change(now):
+    """When the theme next changes after now."""
+    hour = DARK_UNTIL if is_dark(now) else DARK_FROM
+    change = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if change <= now:
+        change += timedelta(days=1)
+    return change
+
+
+class Theme:
+    """The current theme, and the crossfade from the previous one.
+
+    Draw a frame with begin(renderer) and then everything inside
+    `for target in THEME.passes(renderer):`. Normally that is one pass onto
+    the renderer. While fading there is a second pass, drawn in the old
+    theme onto one screen-sized layer that is allocated once, and the layer
+    is blended over the frame with less alpha each time.
+    """
+
+    def __init__(self, now=datetime.now):
+        self.now = now
+        self.name = "light"
+        self.drawing = self.name
+        self.previous = None
+        self.fade_start = 0.0
+        self.progress = 1.0
+        self.deadline = None
+        self.layer = None
+
+    @property
+    def palette(self):
+        return PALETTES[self.drawing]
+
+    @property
+    def background(self):
+        return self.palette["background"]
+
+    @property
+    def font(self):
+        return self.palette["font"]
+
+    def start(self):
+        """Pick the theme for the time of day, without fading, and schedule the next change."""
+        self.switch("dark" if is_dark(self.now()) else "light", fade=False)
+        self.schedule()
+
+    def schedule(self):
+        now = self.now()
+        delay = (next_change(now) - now).total_seconds()
+        self.deadline = time.monotonic() + delay
+        # set_timer() takes an int of milliseconds; a day fits
+        pygame.time.set_timer(THEME_EVENT, max(1, int(delay * 1000)), loops=1)
+
+    def handle(self, event):
+        if event.type == THEME_EVENT:
+            self.update()
+
+    def update(self):
+        """Switch to whichever theme the clock says, and schedule the change after."""
+        self.deadline = None
+        name = "dark" if is_dark(self.now()) else "light"
+        if name != self.name:
+            self.switch(name)
+        self.schedule()
+
+    def switch(self, name, fade=True):
+        if name == self.name:
+            return
+        self.previous = self.name if fade else None
+        self.name = self.drawing = name
+        self.fade_start = time.monotonic()
+        self.progress = 0.0 if fade else 1.0
+        resources.use(name)
+
+    def begin(self, renderer):
+        """Start a frame on the theme's background."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            # The timer event went to a loop that doesn't pass events on
+            self.update()
+        if self.previous is not None:
+            self.progress = min(1.0, (time.monotonic() - self.fade_start) / FADE_TIME)
+            renderer.invalidate()
+        renderer.begin(PALETTES[self.name]["background"])
+
+    def passes(self, renderer):
+        """Yield what to draw the frame onto: the renderer, then during a fade the old-theme layer."""
+        yield renderer
+        if self.previous is None:
+            return
+        if self.progress >= 1.0:
+            # The last frame of the fade; begin() has already invalidated it
+            self.previous = None
+            return
+        screen = renderer.screen
+        if self.layer is None or self.layer.get_size() != screen.get_size():
+            self.layer = pygame.Surface(screen.get_size()).convert()
+        self.layer.fill(PALETTES[self.previous]["background"])
+        self.drawing = self.previous
+        resources.use(self.previous)
+        try:
+            yield self.layer
+        finally:
+            self.drawing = self.name
+            resources.use(self.name)
+        self.layer.set_alpha(round(255 * (1.0 - self.progress)))
+        screen.blit(self.layer, (0, 0))
+
+
+THEME = Theme()
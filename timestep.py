@@ -0,0 +1,37 @@
+import time
+
+from settings import TICK_RATE
+
+
+class FixedTimestep:
+    """Turns wall-clock time into a whole number of fixed game ticks.
+
+    Call advance() once per drawn frame and step the game that many times.
+    What is left over, as a fraction of a tick, is alpha: how far the frame
+    lies between the last tick and the next, for interpolated drawing.
+    Frames longer than max_frame_time are cut short, so a stall slows the
+    game down for a moment instead of making it run hundreds of ticks.
+    """
+
+    def __init__(self, tick_rate=TICK_RATE, max_frame_time=0.25):
+        self.dt = 1.0 / tick_rate
+        self.max_frame_time = max_frame_time
+        self.accumulator = 0.0
+        self.last = time.perf_counter()
+
+    def reset(self):
+        """Forget the time since the last frame, e.g. after a pause or a menu."""
+        self.accumulator = 0.0
+        self.last = time.perf_counter()
+
+    def advance(self):
+        now = time.perf_counter()
+        self.accumulator += min(now - self.last, self.max_frame_time)
+        self.last = now
+        ticks = int(self.accumulator // self.dt)
+        self.accumulator -= ticks * self.dt
+        return ticks
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
@@ -0,0 +1,121 @@
+"""
+Evaluate bot policies over many seeded headless games on every core.
+
+Episodes are split into shards of consecutive seeds and handed to a
+process pool. Every policy plays the same seeds, so the scores are directly
+comparable, and a shard always gets the same seeds however many workers
+run it. Results stream back shard by shard and are summarised per policy.
+
+    python tournament.py --policies idle reflex ducker --episodes 20000
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+import policies
+from simulation import MODES, simulate
+
+PERCENTILES = (50, 90, 99)
+
+
+def play_shard(task):
+    """Play one shard in a worker. Returns (policy, shard, scores, ticks)."""
+    policy_name, shard, seeds, mode, max_ticks = task
+    policy = policies.load(policy_name)
+    scores = []
+    ticks = 0
+    for seed in seeds:
+        game = simulate(policy, mode, seed, max_ticks)
+        scores.append(game.points)
+        ticks += game.ticks
+    return policy_name, shard, scores, ticks
+
+
+class Standings:
+    """Running per-policy score totals."""
+
+    def __init__(self, names):
+        self.scores = {name: [] for name in names}
+        self.ticks = 0
+
+    def add(self, policy_name, scores, ticks):
+        self.scores[policy_name].extend(scores)
+        self.ticks += ticks
+
+    def episodes(self):
+        return sum(len(scores) for scores in self.scores.values())
+
+    def summary(self):
+        rows = {}
+        for name, scores in self.scores.items():
+            if not scores:
+                continue
+            values = np.asarray(scores)
+            row = {"episodes": len(values), "mean": float(values.mean()), "max": int(values.max())}
+            for percentile in PERCENTILES:
+                row["p%d" % percentile] = float(np.percentile(values, percentile))
+            rows[name] = row
+        return rows
+
+    def table(self):
+        header = "%-12s %9s %9s" % ("policy", "episodes", "mean")
+        header += "".join(" %9s" % ("p%d" % p) for p in PERCENTILES) + " %9s" % "max"
+        lines = [header]
+        for name, row in sorted(self.summary().items(), key=lambda item: -item[1]["mean"]):
+            line = "%-12s %9d %9.1f" % (name, row["episodes"], row["mean"])
+            line += "".join(" %9.1f" % row["p%d" % p] for p in PERCENTILES) + " %9d" % row["max"]
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def shards(policy_names, episodes, shard_size, base_seed, mode, max_ticks):
+    for policy_name in policy_names:
+        for shard, first in enumerate(range(0, episodes, shard_size)):
+            seeds = range(base_seed + first, base_seed + min(first + shard_size, episodes))
+            yield policy_name, shard, seeds, mode, max_ticks
+
+
+def tournament(policy_names, episodes=1000, workers=None, shard_size=100, base_seed=0,
+               mode="single", max_ticks=20000, progress=None):
+    """Play episodes games per policy and return the Standings.
+
+    progress, if given, is called with the Standings after every shard.
+    """
+    standings = Standings(policy_names)
+    tasks = list(shards(policy_names, episodes, shard_size, base_seed, mode, max_ticks))
+    with multiprocessing.Pool(workers) as pool:
+        for policy_name, _, scores, ticks in pool.imap_unordered(play_shard, tasks):
+            standings.add(policy_name, scores, ticks)
+            if progress is not None:
+                progress(standings)
+    return standings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a tournament between bot policies.")
+    parser.add_argument("--policies", nargs="+", default=sorted(policies.POLICIES))
+    parser.add_argument("--episodes", type=int, default=1000, help="episodes per policy")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--shard-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=sorted(MODES), default="single")
+    parser.add_argument("--max-ticks", type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = args.episodes * len(args.policies)
+
+    def report(standings):
+        done = standings.episodes()
+        print("\r%d/%d episodes, %.0f episodes/s" % (done, total, done / (time.perf_counter() - start)),
+              end="", flush=True)
+
+    standings = tournament(args.policies, args.episodes, args.workers, args.shard_size, args.seed,
+                           args.mode, args.max_ticks, report)
+    elapsed = time.perf_counter() - start
+    print()
+    print(standings.table())
+    print("%d episodes, %d ticks in %.1f s: %.0f episodes/s"
+          % (total, standings.ticks, elapsed, total / elapsed))